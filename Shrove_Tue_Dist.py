@@ -10,14 +10,19 @@ Created February 2017
 @author: sean@seanelvidge.com
 """
 import datetime as dt
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 
-# Define a function to return the date which Easter falls on for a given year.
-# This computus comes from: https://en.wikipedia.org/wiki/Computus#Software
-def easter(year):
+# Define a function to return the month and day which Easter falls on for a
+# given year. This computus comes from:
+# https://en.wikipedia.org/wiki/Computus#Software
+# It only uses integer arithmetic so works equally on an int or a numpy array
+# of years.
+def computus(year):
     a = year % 19
     b = year >> 2
     c = b // 25 + 1
@@ -28,68 +33,135 @@ def easter(year):
     d = e >> 5
     day = e - d * 31
     month = d + 3
+    return month, day
+
+# The date which Easter falls on for a given year
+def easter(year):
+    month, day = computus(year)
     return dt.date(year, month, day)
 
-# Loop through the years 1900 to 9999 finding the date of Easter and then
-# subtracting 47 days to find Shrove Tuesday (Pancake day)
-tue = np.empty(0)
-dates = np.empty(0)
-for i in np.arange(1900,10000):
-    east = easter(i)
-    tue = np.append(tue,np.int((east - dt.timedelta(days=47)).strftime('%m%d')))
-    
-# Put the data in a Pandas dataframe
-df = pd.DataFrame(tue, columns=['date'], dtype='int')
-    
-# Get min and max dates for plotting:
-tuemin = np.int(tue.min()) # 203 - Feb 3rd
-tuemax = np.int(tue.max()) # 309 - March 9th
-
-# Numbers define month and day, MDD
-rng = np.concatenate((np.arange(tuemin,230),np.arange(301,tuemax+1)))
-daterng = np.empty(0, dtype='datetime64[D]')
-for rn in rng:
-    daterng = np.append(daterng, dt.datetime.strptime('1904'+np.str(rn),
-                                            '%Y%m%d')-dt.timedelta(hours=12))
-
-values = np.empty(0)
-for rn in rng:
-    values = np.append(values, len(np.where(df['date'] == rn)[0]))
-
-# Convert numbers into percentages
-percent = 100*values/tue.shape[0]
-
-# Set this up for plotting
-months = mdates.MonthLocator() # Every month
-# Every 3rd day
-days = mdates.DayLocator(range(1, 31), interval=3)
-daysFmt = mdates.DateFormatter("%b %d")
-
-fig, ax = plt.subplots()
-
-# Bar plot
-plt.bar(daterng, percent, width=1.0, align='center', alpha=0.75)
-
-ax.xaxis.set_major_locator(days)
-ax.xaxis.set_major_formatter(daysFmt)
-ax.autoscale_view()
-
-ax.set_ylabel('% of Pancake Days',size=20)
-ax.set_title('Distribution of Pancake Days \nfrom year 1900 to 9999',size=20)
-
-for tick in ax.xaxis.get_majorticklabels():
-    tick.set_horizontalalignment("right")
-
-# Set some tick parameters
-plt.tick_params(
-    axis='x',          # changes apply to the x-axis
-    which='both',      # both major and minor ticks are affected
-    bottom='off',      # ticks along the bottom edge are off
-    top='off',         # ticks along the top edge are off
-    labelbottom='on') # labels along the bottom edge are off
-
-fig.autofmt_xdate(rotation=45)
-plt.tick_params(axis='both', which='major', labelsize=20)
-
-fig.tight_layout()
+# The dates (datetime64[D]) which Easter falls on for an array of years
+def easters(years):
+    years = np.asarray(years, dtype=np.int64)
+    # int32 is plenty for the computus and is twice as fast as int64
+    month, day = computus(years.astype(np.int32))
+    # 1st of March of each year, then count on (March has 31 days)
+    march = ((years - 1970) * 12 + 2).astype('datetime64[M]').astype('datetime64[D]')
+    return march + (month - 3) * 31 + day - 1
+
+# Month and day as a number, MDD, for an array of datetime64 dates
+def monthDay(dates):
+    months = dates.astype('datetime64[M]')
+    month = (months - dates.astype('datetime64[Y]')).astype(int) + 1
+    day = (dates - months).astype(int) + 1
+    return month * 100 + day
+
+# The Gregorian dates of Easter repeat every 5,700,000 years, a whole number
+# of 400 year leap year cycles, so counting over one cycle gives the exact
+# long run distribution of any feast a fixed number of days from Easter
+CYCLE = 5700000
+FEASTS = {'Shrove Tuesday': -47, 'Ash Wednesday': -46, 'Ascension': 39,
+          'Pentecost': 49}
+CACHE_DIR = '.easter_cache'
+
+# Number of years in [start, stop) that Easter falls on each of its 35
+# possible days (March 22nd to April 25th), split by common and leap years
+def cycleCounts(start, stop):
+    years = np.arange(start, stop, dtype=np.int32)
+    month, day = computus(years)
+    leap = (years % 4 == 0) & ((years % 100 != 0) | (years % 400 == 0))
+    return np.bincount(leap * 35 + (month - 3) * 31 + day - 22,
+                       minlength=70).reshape(2, 35)
+
+# cycleCounts over a whole Easter cycle, worked out in chunks of years (over
+# nJobs processes, None for all CPUs) and kept in cacheDir (None to always
+# recount)
+def easterCycle(chunk=500000, nJobs=1, cacheDir=CACHE_DIR):
+    fn = os.path.join(cacheDir, 'easter_cycle.npy') if cacheDir else None
+    if fn and os.path.exists(fn):
+        return np.load(fn)
+    starts = range(0, CYCLE, chunk)
+    stops = [min(start + chunk, CYCLE) for start in starts]
+    if nJobs == 1:
+        counts = sum(map(cycleCounts, starts, stops))
+    else:
+        with ProcessPoolExecutor(max_workers=nJobs) as pool:
+            counts = sum(pool.map(cycleCounts, starts, stops))
+    if fn:
+        os.makedirs(cacheDir, exist_ok=True)
+        tmp = fn + '.%d.tmp' % os.getpid()
+        with open(tmp, 'wb') as f:
+            np.save(f, counts)
+        os.replace(tmp, fn)
+    return counts
+
+# Exact distribution of a feast (a name in FEASTS or a number of days from
+# Easter) over the Easter cycle, as a DataFrame indexed by date (MDD) with the
+# number of years in the cycle and the percentage of years on each date
+def feastDistribution(feast='Shrove Tuesday', nJobs=1, cacheDir=CACHE_DIR):
+    offset = FEASTS[feast] if isinstance(feast, str) else int(feast)
+    counts = easterCycle(nJobs=nJobs, cacheDir=cacheDir)
+    # The feast's date for each day of Easter in a common (2001) and leap
+    # (2000) year
+    days = np.arange(35) + offset
+    dates = np.concatenate((monthDay(np.datetime64('2001-03-22') + days),
+                            monthDay(np.datetime64('2000-03-22') + days)))
+    df = pd.DataFrame({'count': counts.ravel()}, index=pd.Index(dates, name='date'))
+    df = df.groupby(level=0).sum()
+    df = df[df['count'] > 0]
+    df['percent'] = 100 * df['count'] / CYCLE
+    return df
+
+
+if __name__ == '__main__':
+    # Exact distribution of Shrove Tuesday (Pancake day), 47 days before Easter
+    dist = feastDistribution('Shrove Tuesday', nJobs=None)
+
+    # Get min and max dates for plotting:
+    tuemin = int(dist.index.min()) # 203 - Feb 3rd
+    tuemax = int(dist.index.max()) # 309 - March 9th
+
+    # Numbers define month and day, MDD
+    rng = np.concatenate((np.arange(tuemin,230),np.arange(301,tuemax+1)))
+    daterng = np.empty(0, dtype='datetime64[D]')
+    for rn in rng:
+        daterng = np.append(daterng, dt.datetime.strptime('1904'+str(rn),
+                                                '%Y%m%d')-dt.timedelta(hours=12))
+
+    # Percentage of years on each date
+    percent = dist['percent'].reindex(rng, fill_value=0).values
+
+    # Set this up for plotting
+    months = mdates.MonthLocator() # Every month
+    # Every 3rd day
+    days = mdates.DayLocator(range(1, 31), interval=3)
+    daysFmt = mdates.DateFormatter("%b %d")
+
+    fig, ax = plt.subplots()
+
+    # Bar plot
+    plt.bar(daterng, percent, width=1.0, align='center', alpha=0.75)
+
+    ax.xaxis.set_major_locator(days)
+    ax.xaxis.set_major_formatter(daysFmt)
+    ax.autoscale_view()
+
+    ax.set_ylabel('% of Pancake Days',size=20)
+    ax.set_title('Distribution of Pancake Days \nover the Gregorian Easter cycle',size=20)
+
+    for tick in ax.xaxis.get_majorticklabels():
+        tick.set_horizontalalignment("right")
+
+    # Set some tick parameters
+    plt.tick_params(
+        axis='x',          # changes apply to the x-axis
+        which='both',      # both major and minor ticks are affected
+        bottom='off',      # ticks along the bottom edge are off
+        top='off',         # ticks along the top edge are off
+        labelbottom='on') # labels along the bottom edge are off
+
+    fig.autofmt_xdate(rotation=45)
+    plt.tick_params(axis='both', which='major', labelsize=20)
+
+    fig.tight_layout()
     
\ No newline at end of file
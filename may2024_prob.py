@@ -2,13 +2,70 @@
 Code used for analysis in "The Probability of the May 2024 Solar Superstorm" by Elvidge and Themens 2024
 """
 
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
 from pyextremes import EVA
+from scipy.optimize import minimize
+from scipy.stats import chi2
 
 ########################################################################################################################
-def GEV_exceedance_probability(xi, mu, sigma, Z):
+# Index configurations: data file and value column (None for the first column after the time stamps), peak storm value
+# Z, extremes method ('BM' block maxima or 'POT' peaks over threshold) with its block size or threshold u and decluster
+# window r, minmax to multiply the data by (-1 for negative indices, to work in that space) and the distribution fitted.
+# rAp data should be downloaded from: serene.bham.ac.uk/resources/download/spwx_indices.csv
+# ap data should be downloaded from: https://kp.gfz-potsdam.de/en/data
+# SMR data should be downloaded from: https://supermag.jhuapl.edu/indices
+# SYM-H and Dst data should be downloaded from: http://wdc.kugi.kyoto-u.ac.jp/
+INDICES = pd.DataFrame.from_records([
+    ('rAp', 'spwx_indices.csv', 'rAp_24', 301, 'BM', '365.2425D', np.nan, None, 1, 'gumbel_r'),
+    ('ap', 'spwx_indices.csv', None, 400, 'BM', '365.2425D', np.nan, None, 1, 'gumbel_r'),
+    ('ap30', 'ap30_data.csv', None, 534, 'BM', '365.2425D', np.nan, None, 1, 'gumbel_r'),
+    ('ap60', 'ap60_data.csv', None, 456, 'BM', '365.2425D', np.nan, None, 1, 'gumbel_r'),
+    ('SMR_min', 'SMR_data.csv', None, 426.6, 'POT', None, 250, '48h', -1, 'genpareto'),
+    ('SMR_hour', 'SMR_data.csv', None, 382.9, 'POT', None, 250, '48h', -1, 'genpareto'),
+    ('SYMH_min', 'SYMH_data.csv', None, 518, 'POT', None, 250, '48h', -1, 'genpareto'),
+    ('SYMH_hour', 'SYMH_data.csv', None, 436, 'POT', None, 250, '48h', -1, 'genpareto'),
+    ('Dst', 'dst_data.csv', None, 412, 'POT', None, 250, '48h', -1, 'genpareto'),
+], columns=['index', 'file', 'column', 'Z', 'method', 'block_size', 'u', 'r', 'minmax', 'distribution'],
+    index='index')
+
+# Start (smoothed sunspot number minimum) of solar cycles 12 to 25
+SOLAR_CYCLE_STARTS = pd.to_datetime(['1878-12', '1890-03', '1902-02', '1913-08', '1923-08', '1933-09', '1944-02',
+                                     '1954-04', '1964-10', '1976-03', '1986-09', '1996-08', '2008-12', '2019-12'])
+
+# On-disk cache of EVT fits, keyed on the content of the input series and the fit settings
+FIT_CACHE_DIR = '.fit_cache'
+FIT_CACHE_MAX_BYTES = 16 * 1024 ** 2
+
+########################################################################################################################
+def _xiFunc(xi, z):
+    """
+    Vectorised (1/xi) * log(1 + xi * z), the common term of the GEV and GPD tails, i.e. (1 + xi*z)**(-1/xi) = exp(-y).
+
+    log1p keeps the small xi case accurate and the xi = 0 (Gumbel/exponential) limit, y = z, is taken element-wise.
+    Outside the support (1 + xi*z <= 0) y is +inf for xi < 0 (above the upper end point, so zero exceedance
+    probability) and -inf for xi > 0 (below the lower end point).
     """
+    xz = xi * z
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.log1p(xz) / xi
+    y = np.where(xi == 0, z, y)
+    return np.where(xz <= -1, np.where(xi < 0, np.inf, -np.inf), y)
+
+
+########################################################################################################################
+def GEV_exceedance_probability(xi, mu, sigma, Z, out=None):
+    """
+
+    All arguments may be scalars or NumPy arrays, which are broadcast against each other (e.g. a vector of bootstrap
+    parameter draws against a grid of return values).
 
     Parameters
     ----------
@@ -16,22 +73,28 @@ def GEV_exceedance_probability(xi, mu, sigma, Z):
     mu : mu/loc/mean parameter
     sigma : sigma/scale/std. dev parameter
     Z : return value
+    out : optional array to write the result into (must have the broadcast shape)
 
     Returns
     -------
     Return period
     """
-    if xi != 0:
-        P = 1 - np.exp(-(1 + xi * (Z - mu) / sigma) ** (-1 / xi))
-    else:
-        P = 1 - np.exp(-np.exp(-(Z - mu) / sigma))
+    xi, mu, sigma, Z = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (xi, mu, sigma, Z)))
 
-    return 1/P
+    # P = 1 - exp(-(1 + xi*(Z - mu)/sigma)**(-1/xi)), with the xi -> 0 limit P = 1 - exp(-exp(-(Z - mu)/sigma))
+    P = -np.expm1(-np.exp(-_xiFunc(xi, (Z - mu) / sigma)))
+
+    with np.errstate(divide='ignore'):
+        T = np.divide(1, P, out=out)
+
+    return T if (out is not None or T.ndim) else T[()]
 
 ########################################################################################################################
-def GPD_exceedance_probability(xi, sigma, u, n, N, Z):
+def GPD_exceedance_probability(xi, sigma, u, n, N, Z, out=None):
     """
 
+    All arguments may be scalars or NumPy arrays, which are broadcast against each other.
+
     Parameters
     ----------
     xi : shape parameter
@@ -40,162 +103,1410 @@ def GPD_exceedance_probability(xi, sigma, u, n, N, Z):
     n : number of distinct events (declustered peaks)
     N : years of data
     Z : return level
+    out : optional array to write the result into (must have the broadcast shape)
 
     Returns
     -------
     Return period
     """
-    # Calculate exceedance probability for the return level Z
-    def xiFunc(xi, sigma, Z, u):
-        if xi != 0:
-            P = (1 + xi * (Z - u) / sigma) ** (-1 / xi)
+    xi, sigma, u, n, N, Z = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (xi, sigma, u, n, N, Z)))
+
+    # Exceedance probability of the return level Z is (1 + xi*(Z - u)/sigma)**(-1/xi) = exp(-y), and the rate of
+    # exceedance is n/N, so the return period is N/n * exp(y)
+    T = np.multiply(N / n, np.exp(_xiFunc(xi, (Z - u) / sigma)), out=out)
+
+    return T if (out is not None or T.ndim) else T[()]
+
+
+########################################################################################################################
+def _batch(extremes):
+    """
+    Stack one or many samples of extremes into a NaN padded (n_samples, n_max) array
+
+    Returns the array and whether a single (1-D) sample was given
+    """
+    if isinstance(extremes, (list, tuple)) and len(extremes) and np.ndim(extremes[0]) == 1:
+        x = np.full((len(extremes), max(len(e) for e in extremes)), np.nan)
+        for i, e in enumerate(extremes):
+            x[i, :len(e)] = e
+        return x, False
+    x = np.asarray(extremes, dtype=float)
+    return np.atleast_2d(x), x.ndim == 1
+
+
+########################################################################################################################
+def _GEV_nll(theta, x, mask):
+    """
+    Negative log-likelihood of the GEV (columns mu, log(sigma), xi) or, with only two columns, the Gumbel distribution
+    for each row of x, along with its analytic gradient with respect to theta.
+    """
+    mu, s = theta[:, 0:1], theta[:, 1:2]
+
+    with np.errstate(all='ignore'):
+        sigma = np.exp(s)
+        y = (x - mu) / sigma
+        if theta.shape[1] == 2:
+            ey = np.exp(-y)
+            terms = s + y + ey
+            dy = 1 - ey
+            grads = [dy / -sigma, 1 - y * dy]
         else:
-            P = np.exp(-(Z - u) / sigma)
-        return P
+            xi = theta[:, 2:3]
+            t = 1 + xi * y
+            L = np.log1p(xi * y)
+            Lxi = L / xi
+            zero = xi[:, 0] == 0
+            Lxi[zero] = y[zero]
+            w = np.exp(-Lxi)
+            terms = s + L + Lxi + w
+            terms[~(t > 0)] = np.inf
+            dy = ((1 + xi) - w) / t
+            dxi = L / (xi * xi) * (w - 1) + y / t * (1 + (1 - w) / xi)
+            # d/dxi suffers from cancellation close to xi = 0, so use its second order expansion there
+            small = np.abs(xi[:, 0]) < 1e-4
+            if small.any():
+                ys, ws, xs = y[small], np.exp(-y[small]), xi[small]
+                y2 = ys * ys
+                dxi[small] = (ys - y2 / 2 + ws * y2 / 2
+                              + 2 * xs * (y2 * (ys / 3 - 0.5) + ws * y2 * ys * (ys / 8 - 1 / 3)))
+            grads = [dy / -sigma, 1 - y * dy, dxi]
 
-    # Rate of exceedance
-    lambda_exceedance = n / N
+    nll = np.where(mask, terms, 0).sum(axis=1)
+    grad = np.stack([np.where(mask, g, 0).sum(axis=1) for g in grads], axis=1)
+    return nll, grad
 
-    # Calculate return period
-    T = 1 / (lambda_exceedance * xiFunc(xi, sigma, Z, u))
 
-    return T
+########################################################################################################################
+def _GPD_nll(theta, x, mask):
+    """
+    Negative log-likelihood of the GPD (columns log(sigma), xi) or, with only one column, the exponential distribution
+    for each row of excesses x, along with its analytic gradient with respect to theta.
+    """
+    s = theta[:, 0:1]
+
+    with np.errstate(all='ignore'):
+        y = x / np.exp(s)
+        if theta.shape[1] == 1:
+            terms = s + y
+            grads = [1 - y]
+        else:
+            xi = theta[:, 1:2]
+            t = 1 + xi * y
+            L = np.log1p(xi * y)
+            Lxi = L / xi
+            zero = xi[:, 0] == 0
+            Lxi[zero] = y[zero]
+            terms = s + L + Lxi
+            terms[~(t > 0)] = np.inf
+            dxi = y / t * (1 + 1 / xi) - L / (xi * xi)
+            small = np.abs(xi[:, 0]) < 1e-4
+            if small.any():
+                ys, xs = y[small], xi[small]
+                y2 = ys * ys
+                dxi[small] = ys - y2 / 2 + 2 * xs * y2 * (ys / 3 - 0.5)
+            grads = [1 - y * (1 + xi) / t, dxi]
+
+    nll = np.where(mask, terms, 0).sum(axis=1)
+    grad = np.stack([np.where(mask, g, 0).sum(axis=1) for g in grads], axis=1)
+    return nll, grad
+
+
+########################################################################################################################
+def _newton(nllFunc, theta, x, maxiter=100, tol=1e-8):
+    """
+    Minimise nllFunc independently for every row of theta with a damped Newton method. The Hessian is a forward
+    difference of the analytic gradient, which is shifted to be positive definite before each step, and each row has its
+    own backtracking line search. Rows stop iterating once their step is negligible.
+    """
+    mask = ~np.isnan(x)
+    theta = theta.copy()
+    k = theta.shape[1]
+    f, g = nllFunc(theta, x, mask)
+    active = np.isfinite(f)
+
+    for _ in range(maxiter):
+        if not active.any():
+            break
+        th, ga, xa, ma = theta[active], g[active], x[active], mask[active]
+
+        # Hessian from differencing the gradient
+        h = 1e-6 * (1 + np.abs(th))
+        H = np.empty((th.shape[0], k, k))
+        for j in range(k):
+            step = th.copy()
+            step[:, j] += h[:, j]
+            H[:, :, j] = (nllFunc(step, xa, ma)[1] - ga) / h[:, j:j + 1]
+        H = (H + np.swapaxes(H, 1, 2)) / 2
+        shift = np.clip(1e-8 - np.linalg.eigvalsh(H)[:, 0], 0, None)
+        delta = -np.linalg.solve(H + shift[:, None, None] * np.eye(k), ga[:, :, None])[:, :, 0]
+
+        # Backtracking line search
+        fa = f[active]
+        slope = (ga * delta).sum(axis=1)
+        alpha = np.ones(th.shape[0])
+        fNew, gNew = nllFunc(th + delta, xa, ma)
+        bad = ~(fNew <= fa + 1e-4 * slope)
+        for _ in range(40):
+            if not bad.any():
+                break
+            alpha[bad] /= 2
+            fTry, gTry = nllFunc(th[bad] + alpha[bad, None] * delta[bad], xa[bad], ma[bad])
+            fNew[bad], gNew[bad] = fTry, gTry
+            bad[bad] = ~(fTry <= fa[bad] + 1e-4 * alpha[bad] * slope[bad])
+        # Rows where no step gives a decrease are at the minimum (to numerical precision)
+        alpha[bad] = 0
+        fNew[bad], gNew[bad] = fa[bad], ga[bad]
+
+        stepTaken = alpha[:, None] * delta
+        idx = np.flatnonzero(active)
+        theta[idx] = th + stepTaken
+        f[idx], g[idx] = fNew, gNew
+        active[idx] = (np.abs(stepTaken) > tol * (1 + np.abs(th))).any(axis=1)
+
+    return theta
+
+
+########################################################################################################################
+def fit_GEV(extremes, init=None, gumbel=False, maxiter=100, tol=1e-8):
+    """
+    Maximum likelihood fit of the GEV (or Gumbel) distribution to one or many samples of block maxima, without the
+    overhead of building a pyextremes EVA object for each.
+
+    Parameters
+    ----------
+    extremes : 1-D array of block maxima, a 2-D (n_samples, n_maxima) array (NaN padded) or a list of 1-D arrays
+    init : optional starting parameters (warm start) in the same form as the returned dictionary, e.g. a previous fit
+    gumbel : fix the shape parameter to zero (Gumbel fit)
+    maxiter : maximum number of Newton iterations
+    tol : relative parameter tolerance for convergence
+
+    Returns
+    -------
+    Dictionary of 'c', 'loc' and 'scale' (just 'loc' and 'scale' if gumbel) in the same form as pyextremes
+    mle_parameters. 'c' follows the scipy.stats.genextreme convention, i.e. c = -xi. Values are scalars for a single
+    sample, otherwise arrays of length n_samples.
+    """
+    x, single = _batch(extremes)
+
+    if init is None:
+        # Gumbel method of moments, which has support everywhere so is always a valid starting point
+        scale = np.sqrt(6) * np.nanstd(x, axis=1) / np.pi
+        theta = np.stack([np.nanmean(x, axis=1) - 0.5772156649 * scale, np.log(scale), np.zeros(x.shape[0])], axis=1)
+    else:
+        theta = np.atleast_1d(init['loc'], np.log(init['scale']), -np.asarray(init.get('c', 0.)))
+        theta = np.stack(np.broadcast_arrays(*theta), axis=1).astype(float)
+        theta = np.broadcast_to(theta, (x.shape[0], 3)).copy()
+    if gumbel:
+        theta = theta[:, :2]
+
+    theta = _newton(_GEV_nll, theta, x, maxiter=maxiter, tol=tol)
+
+    params = {'loc': theta[:, 0], 'scale': np.exp(theta[:, 1])}
+    if not gumbel:
+        params = {'c': -theta[:, 2], **params}
+    return {k: v[0] for k, v in params.items()} if single else params
+
+
+########################################################################################################################
+def fit_GPD(extremes, u, init=None, exponential=False, maxiter=100, tol=1e-8):
+    """
+    Maximum likelihood fit of the GPD (or exponential) distribution, with the location fixed at the threshold, to one or
+    many samples of declustered peaks.
+
+    Parameters
+    ----------
+    extremes : 1-D array of peaks over threshold, a 2-D (n_samples, n_peaks) array (NaN padded) or a list of 1-D arrays
+    u : threshold (scalar or one per sample)
+    init : optional starting parameters (warm start) in the same form as the returned dictionary, e.g. a previous fit
+    exponential : fix the shape parameter to zero (exponential fit)
+    maxiter : maximum number of Newton iterations
+    tol : relative parameter tolerance for convergence
+
+    Returns
+    -------
+    Dictionary of 'c' and 'scale' (just 'scale' if exponential) in the same form as pyextremes mle_parameters (with
+    'c' = xi). Values are scalars for a single sample, otherwise arrays of length n_samples.
+    """
+    x, single = _batch(extremes)
+    x = x - np.reshape(u, (-1, 1))
+
+    if init is None:
+        theta = np.stack([np.log(np.nanmean(x, axis=1)), np.zeros(x.shape[0])], axis=1)
+    else:
+        theta = np.atleast_1d(np.log(init['scale']), init.get('c', 0.))
+        theta = np.stack(np.broadcast_arrays(*theta), axis=1).astype(float)
+        theta = np.broadcast_to(theta, (x.shape[0], 2)).copy()
+    if exponential:
+        theta = theta[:, :1]
+
+    theta = _newton(_GPD_nll, theta, x, maxiter=maxiter, tol=tol)
+
+    params = {'scale': np.exp(theta[:, 0])}
+    if not exponential:
+        params = {'c': theta[:, 1], **params}
+    return {k: v[0] for k, v in params.items()} if single else params
+
+
+########################################################################################################################
+def _return_periods(extremes, Z, method, u, years, gumbel, init=None):
+    """
+    Fit one or many samples of extremes (as for fit_GEV/fit_GPD) and return their return periods at Z, along with the
+    fitted parameters
+    """
+    if method == 'BM':
+        params = fit_GEV(extremes, init=init, gumbel=gumbel)
+        # scipy's genextreme c is -xi
+        return GEV_exceedance_probability(-params.get('c', 0), params['loc'], params['scale'], Z), params
+    params = fit_GPD(extremes, u, init=init)
+    n = np.shape(extremes)[-1]
+    return GPD_exceedance_probability(params['c'], params['scale'], u, n, years, Z), params
+
+
+########################################################################################################################
+def _bootstrap_chunk(extremes, Z, method, u, years, gumbel, init, size, seed):
+    """
+    Return periods of size bootstrap resamples of extremes, drawn with their own random number stream
+    """
+    rng = np.random.default_rng(seed)
+    resamples = extremes[rng.integers(0, len(extremes), size=(size, len(extremes)))]
+    return _return_periods(resamples, Z, method, u, years, gumbel, init=init)[0]
+
+
+########################################################################################################################
+def bootstrap_return_period(extremes, Z, method='BM', u=None, years=None, gumbel=True, n_boot=10000, alpha=0.05,
+                            seed=None, n_jobs=None, chunk_size=500):
+    """
+    Bootstrap confidence interval for the return period of Z. The block maxima or declustered peaks are resampled
+    with replacement and each resample is refitted (with fit_GEV/fit_GPD, warm started from the full sample fit).
+
+    Resamples are processed in chunks, spread over a process pool, and each chunk has its own random number generator
+    spawned from seed, so the result for a given seed does not depend on n_jobs.
+
+    Parameters
+    ----------
+    extremes : 1-D array of block maxima ('BM') or declustered peaks over threshold ('POT')
+    Z : return value
+    method : 'BM' (GEV/Gumbel fit) or 'POT' (GPD fit)
+    u : threshold (POT only)
+    years : years of data. For BM defaults to the number of (annual) blocks
+    gumbel : for BM fit a Gumbel (xi = 0) distribution, as in EVT_GEV_Rtn, rather than the full GEV
+    n_boot : number of bootstrap resamples
+    alpha : the percentile interval covers 1 - alpha (the default 95% is what allComb assumes)
+    seed : seed (or numpy SeedSequence) for the random number streams
+    n_jobs : number of worker processes (None for all CPUs, 1 to run in this process)
+    chunk_size : number of resamples fitted in a single vectorised call
+
+    Returns
+    -------
+    (value, lower, upper, years) tuple, as used by allComb
+    """
+    extremes = np.asarray(extremes, dtype=float)
+    if years is None:
+        if method == 'POT':
+            raise ValueError('years of data must be given for POT extremes')
+        years = len(extremes)
+
+    value, params = _return_periods(extremes, Z, method, u, years, gumbel)
+
+    sizes = [min(chunk_size, n_boot - i) for i in range(0, n_boot, chunk_size)]
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = seed.spawn(len(sizes))
+    args = [(extremes, Z, method, u, years, gumbel, params, size, ss) for size, ss in zip(sizes, seeds)]
+    if n_jobs == 1:
+        T = [_bootstrap_chunk(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            T = list(pool.map(_bootstrap_chunk, *zip(*args)))
+    T = np.concatenate(T)
+
+    lower, upper = np.nanpercentile(T, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return value, lower, upper, years
+
+
+########################################################################################################################
+def _read_chunks(fn, column=None, minmax=1, chunksize=1000000, dtype=np.float32):
+    """
+    Read an index CSV file chunk by chunk, keeping only the time stamps (the first column) and one value column
+
+    Yields (times, values) arrays, datetime64[ns] and dtype respectively, with the values multiplied by minmax
+    """
+    cols = pd.read_csv(fn, nrows=0).columns
+    column = cols[1] if column is None else column
+
+    for chunk in pd.read_csv(fn, usecols=[cols[0], column], dtype={column: dtype}, chunksize=chunksize):
+        times = pd.to_datetime(chunk[cols[0]]).to_numpy()
+        values = chunk[column].to_numpy()
+        if minmax != 1:
+            values *= minmax
+        yield times, values
+
+
+########################################################################################################################
+def read_index(fn, column=None, minmax=1, chunksize=1000000, dtype=np.float32):
+    """
+    Memory-bounded read of an index time series from a CSV file whose first column holds the time stamps.
+
+    Parameters
+    ----------
+    fn : file name
+    column : name of the value column (default: the first column after the time stamps)
+    minmax : multiply the data by this (-1 for negative indices, to work in that space)
+    chunksize : number of rows parsed at a time
+    dtype : dtype the values are stored as
+
+    Returns
+    -------
+    pandas Series of the values with a DatetimeIndex
+    """
+    times, values = zip(*_read_chunks(fn, column=column, minmax=minmax, chunksize=chunksize, dtype=dtype))
+    return pd.Series(np.concatenate(values), index=pd.DatetimeIndex(np.concatenate(times)))
+
+
+########################################################################################################################
+def stream_exceedances(fn, u, column=None, minmax=1, chunksize=1000000, dtype=np.float32):
+    """
+    Pass through an index CSV file in chunks, keeping only the values above the threshold u. The full series is never
+    held in memory.
+
+    Parameters
+    ----------
+    fn : file name
+    u : threshold
+    column : name of the value column (default: the first column after the time stamps)
+    minmax : multiply the data by this (-1 for negative indices, to work in that space)
+    chunksize : number of rows parsed at a time
+    dtype : dtype the values are stored as
+
+    Returns
+    -------
+    exceedances : pandas Series of the values above u (with a DatetimeIndex)
+    start : first time stamp in the file
+    end : last time stamp in the file
+    """
+    start = end = None
+    times, values = [], []
+    for t, v in _read_chunks(fn, column=column, minmax=minmax, chunksize=chunksize, dtype=dtype):
+        if not len(t):
+            continue
+        start = t[0] if start is None else start
+        end = t[-1]
+        above = v > u
+        times.append(t[above])
+        values.append(v[above])
+
+    exceedances = pd.Series(np.concatenate(values), index=pd.DatetimeIndex(np.concatenate(times)))
+    return exceedances, pd.Timestamp(start), pd.Timestamp(end)
+
+
+########################################################################################################################
+def _file_signature(fn, check):
+    """
+    Signature of a source file used to invalidate the index cache: its size along with either its modification time
+    (check='mtime') or its SHA-256 hash (check='hash')
+    """
+    stat = os.stat(fn)
+    if check != 'hash':
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    sha = hashlib.sha256()
+    with open(fn, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 24), b''):
+            sha.update(block)
+    return {'size': stat.st_size, 'sha256': sha.hexdigest()}
+
+
+########################################################################################################################
+def _write_npy(fn, rawFn, dtype, n):
+    """
+    Turn a raw binary file of n values into a .npy file, copying it in blocks rather than loading it
+    """
+    with open(fn, 'wb') as f:
+        np.lib.format.write_array_header_1_0(f, {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                 'fortran_order': False, 'shape': (n,)})
+        with open(rawFn, 'rb') as raw:
+            shutil.copyfileobj(raw, f, 1 << 24)
+    os.remove(rawFn)
+
+
+########################################################################################################################
+def load_index(fn, column=None, minmax=1, cache_dir=None, check='mtime', dtype=np.float32):
+    """
+    Load an index time series through a binary cache. The first call converts the CSV (in chunks) into a pair of .npy
+    files holding the time stamps and the values. Later calls memory map those files, so nothing is parsed or copied.
+    The cache is rebuilt whenever the source file changes.
+
+    Parameters
+    ----------
+    fn : file name of the CSV (time stamps in the first column)
+    column : name of the value column (default: the first column after the time stamps)
+    minmax : multiply the data by this (-1 for negative indices, to work in that space)
+    cache_dir : directory for the cache files (default: .index_cache next to fn)
+    check : 'mtime' to invalidate on a change of file size/modification time, 'hash' on a change of size/SHA-256 hash
+    dtype : dtype the values are stored as
+
+    Returns
+    -------
+    times : read-only datetime64[ns] array (memory mapped)
+    values : read-only array of the values (memory mapped)
+    """
+    if column is None:
+        column = pd.read_csv(fn, nrows=0).columns[1]
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(fn)), '.index_cache')
+    base = os.path.join(cache_dir, f'{os.path.basename(fn)}.{column}.{minmax:g}')
+    timesFn, valuesFn, metaFn = base + '.times.npy', base + '.values.npy', base + '.json'
+
+    signature = _file_signature(fn, check)
+    try:
+        with open(metaFn) as f:
+            meta = json.load(f)
+        valid = all(meta['source'].get(k) == v for k, v in signature.items()) and meta['dtype'] == np.dtype(dtype).str
+    except (OSError, ValueError, KeyError):
+        valid = False
+
+    if not valid:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f'{base}.{os.getpid()}'
+        try:
+            n = 0
+            with open(tmp + '.times', 'wb') as ft, open(tmp + '.values', 'wb') as fv:
+                for t, v in _read_chunks(fn, column=column, minmax=minmax, dtype=dtype):
+                    ft.write(t.astype('datetime64[ns]').tobytes())
+                    fv.write(v.tobytes())
+                    n += len(t)
+            _write_npy(tmp + '.times.npy', tmp + '.times', 'datetime64[ns]', n)
+            _write_npy(tmp + '.values.npy', tmp + '.values', dtype, n)
+            os.replace(tmp + '.times.npy', timesFn)
+            os.replace(tmp + '.values.npy', valuesFn)
+            # The metadata goes last, so a partly written cache is never seen as valid
+            with open(tmp + '.json', 'w') as f:
+                json.dump({'source': signature, 'column': column, 'minmax': minmax, 'dtype': np.dtype(dtype).str,
+                           'length': n}, f, default=lambda x: x.item())
+            os.replace(tmp + '.json', metaFn)
+        except BaseException:
+            # Leave no partly written temporary files behind
+            for ext in ('.times', '.values', '.times.npy', '.values.npy', '.json'):
+                if os.path.exists(tmp + ext):
+                    os.remove(tmp + ext)
+            raise
+
+    return np.load(timesFn, mmap_mode='r'), np.load(valuesFn, mmap_mode='r')
+
+
+########################################################################################################################
+def _first_max(v, starts):
+    """
+    Position of the first occurrence of the maximum of each contiguous segment of v, where the segments begin at starts
+    """
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(v)]))
+    atMax = np.flatnonzero(v == np.maximum.reduceat(v, starts)[segment])
+    return atMax[np.r_[True, segment[atMax[1:]] != segment[atMax[:-1]]]]
+
+
+########################################################################################################################
+def decluster_peaks(times, values, u, r='24h'):
+    """
+    Declustered peaks over threshold, in a single vectorised pass. Equivalent to pyextremes' POT extraction:
+    exceedances of u are split into clusters wherever consecutive exceedances are more than r apart, and the first
+    occurrence of each cluster's maximum is its peak.
+
+    Parameters
+    ----------
+    times : sorted datetime64 array of the time stamps
+    values : array of the values
+    u : threshold
+    r : declustering window (anything pandas.to_timedelta accepts)
+
+    Returns
+    -------
+    pandas Series of the cluster peaks (float64, with a DatetimeIndex), in the same form as EVA.extremes
+    """
+    values = np.asarray(values)
+    above = np.flatnonzero(values > u)
+    t = np.asarray(times)[above]
+    v = values[above].astype(float)
+
+    if len(v):
+        # Index of the first exceedance of each cluster
+        starts = np.r_[0, np.flatnonzero(np.diff(t) > pd.to_timedelta(r).to_timedelta64()) + 1]
+        peaks = _first_max(v, starts)
+        t, v = t[peaks], v[peaks]
+
+    return pd.Series(v, index=pd.DatetimeIndex(t, name='date-time'), name='extreme values')
+
+
+########################################################################################################################
+def block_maxima(times, values, block_size='365.2425D'):
+    """
+    Block maxima, in a single vectorised pass. Equivalent to pyextremes' BM extraction: blocks of length block_size
+    start at the first time stamp and the first occurrence of each block's maximum is taken. Blocks with no data are
+    skipped and NaN values ignored.
+
+    Parameters
+    ----------
+    times : sorted datetime64 array of the time stamps
+    values : array of the values
+    block_size : block length (anything pandas.to_timedelta accepts)
+
+    Returns
+    -------
+    pandas Series of the block maxima (float64, with a DatetimeIndex), in the same form as EVA.extremes
+    """
+    times, values = np.asarray(times), np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    t, v = times[valid], values[valid]
+
+    if len(v):
+        block = (t - times[0]) // pd.to_timedelta(block_size).to_timedelta64()
+        peaks = _first_max(v, np.r_[0, np.flatnonzero(np.diff(block)) + 1])
+        t, v = t[peaks], v[peaks]
+
+    return pd.Series(v, index=pd.DatetimeIndex(t, name='date-time'), name='extreme values')
+
+
+########################################################################################################################
+def GPD_threshold_sweep(times, values, thresholds, r='24h'):
+    """
+    Mean residual life and GPD parameter stability curves over a grid of thresholds, for checking the choice of u.
+
+    The exceedances of the lowest threshold are extracted once. The mean residual life comes from suffix sums over
+    those exceedances, sorted once. Thresholds are then visited in increasing order. Each one is declustered from the
+    previous threshold's (smaller) set of exceedances, and its GPD fit is warm started from the previous fit.
+
+    Parameters
+    ----------
+    times : sorted datetime64 array of the time stamps
+    values : array of the values
+    thresholds : array of thresholds
+    r : declustering window (anything pandas.to_timedelta accepts)
+
+    Returns
+    -------
+    DataFrame indexed by threshold of the number of exceedances, the mean excess with its 95% confidence bounds, the
+    number of declustered peaks, the GPD 'c' and 'scale' and the modified scale (scale - c * u), which should be
+    constant above a suitable threshold
+    """
+    thresholds = np.sort(np.asarray(thresholds, dtype=float))
+    values = np.asarray(values)
+    above = values > thresholds[0]
+    t, v = np.asarray(times)[above], values[above].astype(float)
+
+    # Mean residual life, from suffix sums of the sorted exceedances
+    ordered = np.sort(v)
+    S1 = np.r_[np.cumsum(ordered[::-1])[::-1], 0]
+    S2 = np.r_[np.cumsum(ordered[::-1] ** 2)[::-1], 0]
+    k = np.searchsorted(ordered, thresholds, side='right')
+    count = len(ordered) - k
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = S1[k] / count
+        sd = np.sqrt(np.clip(S2[k] / count - mean ** 2, 0, None))
+    meanExcess = mean - thresholds
+    halfWidth = 1.96 * sd / np.sqrt(count)
+
+    # Parameter stability
+    nPeaks = np.zeros(len(thresholds), dtype=int)
+    c, scale = np.full(len(thresholds), np.nan), np.full(len(thresholds), np.nan)
+    params = None
+    for i, u in enumerate(thresholds):
+        above = v > u
+        t, v = t[above], v[above]
+        peaks = decluster_peaks(t, v, u, r).values
+        nPeaks[i] = len(peaks)
+        if len(peaks) > 1:
+            params = fit_GPD(peaks, u, init=params)
+            c[i], scale[i] = params['c'], params['scale']
+
+    return pd.DataFrame({'n_exceedances': count, 'mean_excess': meanExcess,
+                         'mean_excess_lower': meanExcess - halfWidth, 'mean_excess_upper': meanExcess + halfWidth,
+                         'n_peaks': nPeaks, 'c': c, 'scale': scale, 'modified_scale': scale - c * thresholds},
+                        index=pd.Index(thresholds, name='u'))
+
+
+########################################################################################################################
+def _fit_key(times, values, **settings):
+    """
+    Content address of a fit: a hash of the input series and all of the fit settings
+    """
+    h = hashlib.blake2b(digest_size=20)
+    h.update(np.ascontiguousarray(times).view(np.int64))
+    h.update(np.ascontiguousarray(values))
+    h.update(json.dumps(settings, sort_keys=True, default=lambda x: x.item()).encode())
+    return h.hexdigest()
+
+
+########################################################################################################################
+def _config_key(times, values, cfg, engine):
+    """
+    Fit cache key for an index configuration (a row of INDICES) and fitting engine
+    """
+    if cfg.method == 'BM':
+        return _fit_key(times, values, method='BM', block_size=cfg.block_size, distribution=cfg.distribution,
+                        engine=engine)
+    return _fit_key(times, values, method='POT', u=cfg.u, r=cfg.r, distribution=cfg.distribution, engine=engine)
 
 
 ########################################################################################################################
-def EVT_GEV_Rtn(index):
+def fit_cache_get(key, cache_dir=FIT_CACHE_DIR):
+    """
+    Look up a fit in the on-disk cache, marking it as recently used. Returns None if it is not there.
+    """
+    fn = os.path.join(cache_dir, key + '.json')
+    try:
+        with open(fn) as f:
+            entry = json.load(f)
+        os.utime(fn)
+    except (OSError, ValueError):
+        # Missing, or removed by another process in the meantime
+        return None
+    return entry
+
+
+########################################################################################################################
+def fit_cache_put(key, entry, cache_dir=FIT_CACHE_DIR, max_bytes=FIT_CACHE_MAX_BYTES):
+    """
+    Store a fit (a JSON serialisable dictionary) in the on-disk cache, then evict the least recently used entries until
+    the cache is no bigger than max_bytes. Entries are written to a temporary file and renamed into place, so
+    concurrent readers only ever see complete entries.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = os.path.join(cache_dir, f'.{key}.{os.getpid()}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(entry, f, default=lambda x: x.item())
+    os.replace(tmp, os.path.join(cache_dir, key + '.json'))
+
+    files = []
+    with os.scandir(cache_dir) as it:
+        for e in it:
+            try:
+                if e.name.endswith('.json'):
+                    stat = e.stat()
+                    files.append((stat.st_mtime_ns, stat.st_size, e.path))
+            except FileNotFoundError:
+                pass
+    total = sum(f[1] for f in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+########################################################################################################################
+def EVT_GEV_Rtn(index, engine='pyextremes', cache_dir=FIT_CACHE_DIR):
     """
     Calculate the EVT GEV Gumbel fits.
 
     index should be one of: 'rAp', 'ap', 'ap30', 'ap60'
+    engine should be 'pyextremes' (fit with pyextremes) or 'native' (fit with fit_GEV)
+    cache_dir is the directory of the fit cache (None to always refit)
 
     """
-    if index == 'rAp':
-        fn = 'spwx_indices.csv'
-        # rAp data should be downloaded from: serene.bham.ac.uk/resources/download/spwx_indices.csv
-        Z = 301 # peak storm value
-    elif index == 'ap':
-        fn = 'spwx_indices.csv'
-        # ap data should be downloaded from: https://kp.gfz-potsdam.de/en/data
-        Z = 400 # peak storm value
-    elif index == 'ap30':
-        fn = 'ap30_data.csv'
-        # ap data should be downloaded from: https://kp.gfz-potsdam.de/en/data
-        Z = 534  # peak storm value
-    elif index == 'ap60':
-        fn = 'ap60_data.csv'
-        # ap data should be downloaded from: https://kp.gfz-potsdam.de/en/data
-        Z = 456  # peak storm value
+    cfg = INDICES.loc[index]
+    fn, Z = cfg.file, cfg.Z
 
-    df = pd.read_csv(fn, delimiter=',')
+    times, values = load_index(fn, cfg.column)
 
-    extreme_value_analysis = EVA(df['rAp_24'])
+    key = _config_key(times, values, cfg, engine)
+    entry = fit_cache_get(key, cache_dir) if cache_dir else None
+    if entry is None:
+        extreme_value_analysis = EVA(pd.Series(values, index=pd.DatetimeIndex(times)))
 
-    # Extract extremes
-    extreme_value_analysis.get_extremes(method="BM", block_size="1Y")
+        # Extract extremes
+        extreme_value_analysis.get_extremes(method="BM", block_size=cfg.block_size)
 
-    # Fit model
-    fit = extreme_value_analysis.fit_model()
+        # Fit model
+        if engine == 'native':
+            params = fit_GEV(extreme_value_analysis.extremes.values, gumbel=True)
+        else:
+            fit = extreme_value_analysis.fit_model()
+            params = extreme_value_analysis.distribution.mle_parameters
 
-    print(GEV_exceedance_probability(0,extreme_value_analysis.distribution.mle_parameters['loc'],
-                                 extreme_value_analysis.distribution.mle_parameters['scale'],Z))
+        entry = {'params': params, 'extremes': extreme_value_analysis.extremes.values.tolist(),
+                 'start': str(times[0]), 'end': str(times[-1])}
+        if cache_dir:
+            fit_cache_put(key, entry, cache_dir)
+    params = entry['params']
+
+    T = GEV_exceedance_probability(0,params['loc'],params['scale'],Z)
+    print(T)
+    return T
 
 
 ########################################################################################################################
-def EVT_GPD_Rtn(index):
+def EVT_GPD_Rtn(index, engine='pyextremes', cache_dir=FIT_CACHE_DIR):
     """
     Calculate the EVT GPD fits.
 
     index should be one of: 'SMR_min', 'SMR_hour', 'SYMH_min', 'SYMH_hour', 'Dst'
+    engine should be 'pyextremes' (fit with pyextremes) or 'native' (fit with fit_GPD)
+    cache_dir is the directory of the fit cache (None to always refit)
     """
-    if index == 'SMR_min':
-        fn = 'SMR_data.csv'
-        # SMR data should be downloaded from: https://supermag.jhuapl.edu/indices
-        Z = 426.6  # peak storm value
-        u = 250 # threshold
-        r = '48H' # decluster threshold
-        minmax = -1 # multiply the data by -1 (as it is negative index, and work in that space)
-    elif index == 'SMR_hour':
-        fn = 'SMR_data.csv'
-        # SMR data should be downloaded from: https://supermag.jhuapl.edu/indices
-        Z = 382.9  # peak storm value
-        u = 250  # threshold
-        r = '48H'  # decluster threshold
-        minmax = -1  # multiply the data by -1 (as it is negative index, and work in that space)
-    elif index == 'SYMH_min':
-        fn = 'SYMH_data.csv'
-        # SYM-H data should be downloaded from: http://wdc.kugi.kyoto-u.ac.jp/
-        Z = 518  # peak storm value
-        u = 250  # threshold
-        r = '48H'  # decluster threshold
-        minmax = -1  # multiply the data by -1 (as it is negative index, and work in that space)
-    elif index == 'SMHY_hour':
-        fn = 'SYMH_data.csv'
-        # SYM-H data should be downloaded from: http://wdc.kugi.kyoto-u.ac.jp/
-        Z = 436  # peak storm value
-        u = 250  # threshold
-        r = '48H'  # decluster threshold
-        minmax = -1  # multiply the data by -1 (as it is negative index, and work in that space)
-    elif index == 'Dst':
-        fn = 'dst_data.csv'
-        # SYM-H data should be downloaded from: http://wdc.kugi.kyoto-u.ac.jp/
-        Z = 412  # peak storm value
-        u = 250  # threshold
-        r = '48H'  # decluster threshold
-        minmax = -1  # multiply the data by -1 (as it is negative index, and work in that space)
-
-    df = pd.read_csv(fn, delimiter=',')*minmax
-
-    extreme_value_analysis = EVA(df)
-
-    # Extract extremes
-    extreme_value_analysis.get_extremes(method="POT", threshold=u, r=r)
-
-    # Fit model
-    fit = extreme_value_analysis.fit_model(distribution='genpareto')
-
-    timeDiff = (extreme_value_analysis.data.index[-1] - extreme_value_analysis.data.index[0])
-
-    GPD_exceedance_probability(extreme_value_analysis.distribution.mle_parameters['c'],
-                               extreme_value_analysis.distribution.mle_parameters['scale'],
-                               u,
-                               extreme_value_analysis.extremes.shape[0],
-                               (timeDiff.seconds/(24*3600) + timeDiff.days)/365.2425, Z)
+    cfg = INDICES.loc[index]
+    fn, Z, u, r, minmax = cfg.file, cfg.Z, cfg.u, cfg.r, cfg.minmax
+
+    times, values = load_index(fn, cfg.column, minmax=minmax)
+
+    key = _config_key(times, values, cfg, engine)
+    entry = fit_cache_get(key, cache_dir) if cache_dir else None
+    if entry is None:
+        # Extract extremes
+        extremes = decluster_peaks(times, values, u, r)
+
+        # Fit model
+        if engine == 'native':
+            params = fit_GPD(extremes.values, u)
+        else:
+            # Only the exceedances are needed for the declustered peaks
+            above = values > u
+            extreme_value_analysis = EVA(pd.Series(values[above], index=pd.DatetimeIndex(times[above]),
+                                                   name=extremes.name))
+            extreme_value_analysis.set_extremes(extremes, method="POT", threshold=u, r=r)
+            fit = extreme_value_analysis.fit_model(distribution='genpareto')
+            params = extreme_value_analysis.distribution.mle_parameters
+
+        entry = {'params': params, 'extremes': extremes.values.tolist(), 'start': str(times[0]), 'end': str(times[-1])}
+        if cache_dir:
+            fit_cache_put(key, entry, cache_dir)
+    params = entry['params']
+
+    timeDiff = pd.Timestamp(entry['end']) - pd.Timestamp(entry['start'])
+
+    return GPD_exceedance_probability(params['c'],
+                                      params['scale'],
+                                      u,
+                                      len(entry['extremes']),
+                                      (timeDiff.seconds/(24*3600) + timeDiff.days)/365.2425, Z)
 
 
 ########################################################################################################################
-def allComb(*tuples):
+def _EVT_extremes(cfg, cache_dir):
     """
-    Find the weighted combination of a series of EVT estimates
+    Extremes, native fit parameters and years of data for an index configuration (a row of INDICES), through the fit
+    cache
+    """
+    times, values = load_index(cfg.file, cfg.column, minmax=cfg.minmax)
+
+    key = _config_key(times, values, cfg, 'native')
+    entry = fit_cache_get(key, cache_dir) if cache_dir else None
+    if entry is None:
+        if cfg.method == 'BM':
+            extremes = block_maxima(times, values, cfg.block_size).values
+            params = fit_GEV(extremes, gumbel=cfg.distribution == 'gumbel_r')
+        else:
+            extremes = decluster_peaks(times, values, cfg.u, cfg.r).values
+            params = fit_GPD(extremes, cfg.u)
+        entry = {'params': params, 'extremes': extremes.tolist(), 'start': str(times[0]), 'end': str(times[-1])}
+        if cache_dir:
+            fit_cache_put(key, entry, cache_dir)
+    params, extremes = entry['params'], np.array(entry['extremes'])
+    if cfg.method == 'BM':
+        # Annual blocks, so the return period is in years
+        years = len(extremes)
+    else:
+        years = (pd.Timestamp(entry['end']) - pd.Timestamp(entry['start'])) / pd.Timedelta(days=365.2425)
+    return params, extremes, years
+
+
+########################################################################################################################
+def _EVT_run(name, cfg, n_boot, seed, cache_dir):
+    """
+    Extract, fit (with the native engine) and optionally bootstrap a single index configuration (a row of INDICES)
+    """
+    start = time.perf_counter()
+    gumbel = cfg.distribution == 'gumbel_r'
+    params, extremes, years = _EVT_extremes(cfg, cache_dir)
+
+    if cfg.method == 'BM':
+        T = GEV_exceedance_probability(-params.get('c', 0), params['loc'], params['scale'], cfg.Z)
+    else:
+        T = GPD_exceedance_probability(params['c'], params['scale'], cfg.u, len(extremes), years, cfg.Z)
+    lower = upper = np.nan
+    if n_boot:
+        T, lower, upper, years = bootstrap_return_period(extremes, cfg.Z, method=cfg.method, u=cfg.u, years=years,
+                                                         gumbel=gumbel, n_boot=n_boot, seed=seed, n_jobs=1)
+
+    return {'index': name, 'method': cfg.method, 'distribution': cfg.distribution, 'Z': cfg.Z,
+            'c': params.get('c', 0.), 'loc': params.get('loc', cfg.u), 'scale': params['scale'],
+            'n_extremes': len(extremes), 'years': years, 'return_period': T, 'lower': lower, 'upper': upper,
+            'seconds': time.perf_counter() - start}
+
+
+########################################################################################################################
+def EVT_batch(configs=None, n_boot=0, seed=None, n_jobs=None, cache_dir=FIT_CACHE_DIR):
+    """
+    Fit many index configurations concurrently, each in its own worker process, using the native extraction and
+    fitting engine.
 
     Parameters
     ----------
-    tuples: Each tuple should be len 4 (value, lower bound, upper bound, years) eg 1-in-17 (14,18) with 35 years of data
-            would be (17,14,18,35)
+    configs : DataFrame of index configurations with the same columns as INDICES (default: INDICES), or a list of
+              names of rows of INDICES
+    n_boot : number of bootstrap resamples for the confidence intervals (0 for none)
+    seed : seed for the bootstrap random number streams (each configuration gets its own)
+    n_jobs : number of worker processes (None for all CPUs, 1 to run in this process)
+    cache_dir : directory of the fit cache (None to always refit)
+
+    Returns
+    -------
+    DataFrame, indexed by configuration name, of the fitted parameters ('c' in the scipy convention, 'loc' is the
+    threshold for POT), number of extremes, years of data, return period at Z and its bootstrap bounds, and the run time
+    in seconds. The 'return_period', 'lower', 'upper' and 'years' columns are the allComb inputs.
+    """
+    if configs is None:
+        configs = INDICES
+    elif not isinstance(configs, pd.DataFrame):
+        configs = INDICES.loc[list(configs)]
+
+    seeds = np.random.SeedSequence(seed).spawn(len(configs))
+    args = [(name, cfg, n_boot, ss, cache_dir) for (name, cfg), ss in zip(configs.iterrows(), seeds)]
+    if n_jobs == 1:
+        results = [_EVT_run(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(_EVT_run, *zip(*args)))
+
+    return pd.DataFrame(results).set_index('index')
+
+
+########################################################################################################################
+def _profile_nll(free, T, method, gumbel, x, Z, u, rate):
+    """
+    Negative log-likelihood of the extremes x (a 1 row 2-D array) at the free parameters, with the remaining parameter
+    set so that the return period of Z is T. The free parameters are log(scale) (and xi) for BM and xi for POT.
+    """
+    mask = ~np.isnan(x)
+    with np.errstate(all='ignore'):
+        if method == 'BM':
+            # The level with exceedance probability 1/T has standardised value z, so loc = Z - scale * z
+            if not T > 1:
+                return np.inf
+            logq = np.log(-np.log1p(-1 / T))
+            if gumbel:
+                theta = [Z + np.exp(free[0]) * logq, free[0]]
+            else:
+                xi = free[1]
+                z = -logq if xi == 0 else np.expm1(-xi * logq) / xi
+                theta = [Z - np.exp(free[0]) * z, free[0], xi]
+            return _GEV_nll(np.array([theta]), x, mask)[0][0]
+
+        # Probability of an exceedance of u exceeding Z, which fixes the scale
+        logp = -np.log(rate * T)
+        xi = free[0]
+        sigma = (Z - u) / -logp if xi == 0 else xi * (Z - u) / np.expm1(-xi * logp)
+        if not (logp < 0 and sigma > 0):
+            return np.inf
+        return _GPD_nll(np.array([[np.log(sigma), xi]]), x - u, mask)[0][0]
+
+
+########################################################################################################################
+def _profile_segment(logT, free, method, gumbel, x, Z, u, rate, nllMin, crit):
+    """
+    Profile deviance at a sequence of log return periods moving away from the MLE. Each point is a constrained refit
+    warm started from the previous point, and the sequence stops once the deviance passes crit.
+    """
+    dev = []
+    for lt in logT:
+        res = minimize(_profile_nll, free, args=(np.exp(lt), method, gumbel, x, Z, u, rate), method='Nelder-Mead',
+                       options={'xatol': 1e-6, 'fatol': 1e-8})
+        if np.isfinite(res.fun):
+            free = res.x
+        dev.append(2 * (res.fun - nllMin))
+        if dev[-1] > crit:
+            break
+    return np.array(dev)
+
+
+########################################################################################################################
+def EVT_profile(configs=None, alpha=0.05, step=0.02, max_steps=2000, n_jobs=None, cache_dir=FIT_CACHE_DIR):
+    """
+    Profile likelihood confidence intervals for the return period of Z, for many index configurations at once.
+
+    The profile runs over a grid in log return period, outwards from the MLE in both directions. Every point is a
+    refit constrained to that return period, warm started from its neighbour. Each direction of each configuration is
+    a separate task on a process pool. The interval is where the profile deviance is below the chi-squared(1) 1 - alpha
+    quantile, interpolated between grid points.
+
+    Parameters
+    ----------
+    configs : DataFrame of index configurations with the same columns as INDICES (default: INDICES), or a list of
+              names of rows of INDICES
+    alpha : the interval covers 1 - alpha
+    step : grid spacing in log return period
+    max_steps : maximum number of grid points in each direction
+    n_jobs : number of worker processes (None for all CPUs, 1 to run in this process)
+    cache_dir : directory of the fit cache (None to always refit)
+
+    Returns
+    -------
+    DataFrame, indexed by configuration name, of the return period at Z and its lower and upper bounds (infinite if the
+    deviance does not reach the critical value within max_steps)
+    """
+    if configs is None:
+        configs = INDICES
+    elif not isinstance(configs, pd.DataFrame):
+        configs = INDICES.loc[list(configs)]
+    crit = chi2.ppf(1 - alpha, 1)
+
+    results, tasks = [], []
+    for name, cfg in configs.iterrows():
+        params, extremes, years = _EVT_extremes(cfg, cache_dir)
+        gumbel = cfg.distribution == 'gumbel_r'
+        x = extremes[None, :]
+        rate = len(extremes) / years
+        if cfg.method == 'BM':
+            T = GEV_exceedance_probability(-params.get('c', 0), params['loc'], params['scale'], cfg.Z)
+            free = [np.log(params['scale'])] if gumbel else [np.log(params['scale']), -params['c']]
+        else:
+            T = GPD_exceedance_probability(params['c'], params['scale'], cfg.u, len(extremes), years, cfg.Z)
+            free = [params['c']]
+        nllMin = _profile_nll(free, T, cfg.method, gumbel, x, cfg.Z, cfg.u, rate)
+        results.append({'index': name, 'Z': cfg.Z, 'return_period': T})
+        for direction in (-1, 1):
+            logT = np.log(T) + direction * step * np.arange(1, max_steps + 1)
+            tasks.append((logT, free, cfg.method, gumbel, x, cfg.Z, cfg.u, rate, nllMin, crit))
+
+    if n_jobs == 1:
+        devs = [_profile_segment(*t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            devs = list(pool.map(_profile_segment, *zip(*tasks)))
+
+    for i, result in enumerate(results):
+        for key, task, dev in zip(('lower', 'upper'), tasks[2 * i:2 * i + 2], devs[2 * i:2 * i + 2]):
+            logT = np.r_[np.log(result['return_period']), task[0][:len(dev)]]
+            dev = np.r_[0, dev]
+            if dev[-1] <= crit:
+                result[key] = 0 if key == 'lower' else np.inf
+            elif np.isinf(dev[-1]):
+                # Left the parameter space, e.g. a GPD return period below the mean time between exceedances
+                result[key] = np.exp(logT[-2])
+            else:
+                result[key] = np.exp(np.interp(crit, dev[-2:], logT[-2:]))
+
+    return pd.DataFrame(results).set_index('index')
+
+
+########################################################################################################################
+def load_aligned(indices=('SMR_min', 'SYMH_min', 'Dst', 'ap30', 'ap60'), cadence='1min', start=None, end=None):
+    """
+    Load several indices (through the binary cache) onto one shared time axis. At each time on the axis an index takes
+    its latest sample at or before that time, provided that sample is less than the index's own cadence (its median
+    sample spacing) old. Otherwise the value is NaN. The lookup is a single binary search per index.
+
+    Parameters
+    ----------
+    indices : names of INDICES configurations (negative indices are sign flipped, as set by their minmax)
+    cadence : spacing of the shared time axis
+    start, end : limits of the time axis (default: the union of the indices' time spans)
+
+    Returns
+    -------
+    DataFrame with the shared axis as its DatetimeIndex and one float32 column per index
     """
-    def calcVar(c_l, c_u):
-        return ((c_u - c_l) / 3.92) ** 2
+    series = [load_index(cfg.file, cfg.column, minmax=cfg.minmax) for _, cfg in INDICES.loc[list(indices)].iterrows()]
+    step = pd.to_timedelta(cadence).to_timedelta64()
+    start = min(t[0] for t, _ in series) if start is None else pd.Timestamp(start).to_datetime64()
+    end = max(t[-1] for t, _ in series) if end is None else pd.Timestamp(end).to_datetime64()
+    axis = np.arange(start, end + step, step).astype('datetime64[ns]')
 
-    def calcWeight(variances):
-        inv_vars = [1/v for v in variances]
-        total_inv_var = sum(inv_vars)
-        return [iv / total_inv_var for iv in inv_vars]
+    aligned = np.full((len(axis), len(series)), np.nan, dtype=np.float32)
+    for i, (times, values) in enumerate(series):
+        pos = np.searchsorted(times, axis, side='right') - 1
+        valid = pos >= 0
+        valid[valid] = axis[valid] - times[pos[valid]] < np.median(np.diff(times))
+        aligned[valid, i] = values[pos[valid]]
 
-    def calcWeight2(years):
-        total_years = sum(years)
-        return [y / total_years for y in years]
+    return pd.DataFrame(aligned, index=pd.DatetimeIndex(axis, name='date-time'), columns=list(indices))
 
-    variances = [calcVar(t[1], t[2]) for t in tuples]
-    years = [t[3] for t in tuples]
 
-    var_weights = calcWeight(variances)
-    year_weights = calcWeight2(years)
+########################################################################################################################
+def joint_exceedances(aligned, thresholds=None, k=2):
+    """
+    Intervals where at least k of the aligned indices exceed their thresholds at the same time, e.g. to build a
+    multi-index storm catalogue
+
+    Parameters
+    ----------
+    aligned : DataFrame from load_aligned
+    thresholds : dictionary of threshold per index (default: each index's u from INDICES, which must then be set)
+    k : minimum number of indices exceeding their threshold
+
+    Returns
+    -------
+    DataFrame of the start and end of each interval, the largest number of indices exceeding together and the peak of
+    each index within the interval
+    """
+    thresholds = {} if thresholds is None else thresholds
+    u = np.array([thresholds.get(name, INDICES.loc[name].u if name in INDICES.index else np.nan)
+                  for name in aligned.columns])
+    if np.isnan(u).any():
+        raise ValueError('no threshold given for ' + ', '.join(aligned.columns[np.isnan(u)]))
+
+    X = aligned.to_numpy()
+    count = (X > u).sum(axis=1)
+    edges = np.diff(np.r_[0, (count >= k).astype(np.int8), 0])
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    catalogue = pd.DataFrame({'start': aligned.index[starts], 'end': aligned.index[ends - 1]})
+    if len(starts):
+        # A single reduceat over the (start, end) pairs gives each interval's maximum in its even elements
+        pairs = np.c_[starts, ends].ravel()
+        if pairs[-1] == len(X):
+            pairs = pairs[:-1]
+        catalogue['n_exceeding'] = np.maximum.reduceat(count, pairs)[::2]
+        peaks = np.fmax.reduceat(X, pairs, axis=0)[::2]
+        for i, name in enumerate(aligned.columns):
+            catalogue[name] = peaks[:, i]
+    return catalogue
+
+
+########################################################################################################################
+def _window_fits(samples, Z, method, u, years, gumbel):
+    """
+    Fit a batch of windows' extremes (a list of 1-D arrays) in one vectorised call and return their parameters and
+    return periods
+    """
+    if method == 'BM':
+        params = fit_GEV(samples, gumbel=gumbel)
+        T = GEV_exceedance_probability(-params.get('c', 0), params['loc'], params['scale'], Z)
+    else:
+        params = fit_GPD(samples, u)
+        T = GPD_exceedance_probability(params['c'], params['scale'], u, [len(s) for s in samples], years, Z)
+    return params, T
+
+
+########################################################################################################################
+def EVT_windows(index, window_years=30, step_years=1, solar_cycles=False, min_extremes=10, n_jobs=None,
+                chunk_size=50):
+    """
+    Return period of Z as a function of epoch, from fits to sliding windows of the data (or to each solar cycle).
+
+    The extremes are extracted once from the full series and each window takes its share with a binary search, so
+    overlapping windows share the extraction. Block maxima stay on the blocks of the full series, and clusters that
+    straddle a window edge belong to the window holding their peak. Windows are fitted in vectorised batches of
+    chunk_size, spread over a process pool.
+
+    Parameters
+    ----------
+    index : name of one of the INDICES configurations, or a row of it
+    window_years : window length in years
+    step_years : step between window starts in years
+    solar_cycles : use the solar cycles (SOLAR_CYCLE_STARTS) as the windows instead
+    min_extremes : windows with fewer extremes than this are not fitted
+    n_jobs : number of worker processes (None for all CPUs, 1 to run in this process)
+    chunk_size : number of windows fitted in a single vectorised call
+
+    Returns
+    -------
+    DataFrame indexed by window start of the window end, number of extremes, years of data, fitted parameters (as in
+    EVT_batch) and the return period of Z
+    """
+    cfg = INDICES.loc[index] if isinstance(index, str) else index
+    times, values = load_index(cfg.file, cfg.column, minmax=cfg.minmax)
+    if cfg.method == 'BM':
+        extremes = block_maxima(times, values, cfg.block_size)
+    else:
+        extremes = decluster_peaks(times, values, cfg.u, cfg.r)
+    first, last = pd.Timestamp(times[0]), pd.Timestamp(times[-1])
+
+    year = pd.Timedelta(days=365.2425)
+    if solar_cycles:
+        starts = SOLAR_CYCLE_STARTS[SOLAR_CYCLE_STARTS < last]
+        ends = starts[1:].append(pd.DatetimeIndex([last]))
+        keep = ends > first
+        starts, ends = starts[keep], ends[keep]
+    else:
+        # Only whole windows, ending at or before the last sample (none if the data is shorter than a window)
+        n = max(int(np.floor(((last - first) / year - window_years) / step_years)) + 1, 0)
+        starts = first + pd.TimedeltaIndex(np.arange(n) * step_years * year)
+        ends = starts + window_years * year
+
+    # Each window's extremes, and its years of data
+    lo = np.searchsorted(extremes.index.values, starts.values)
+    hi = np.searchsorted(extremes.index.values, ends.values)
+    samples = [extremes.values[a:b] for a, b in zip(lo, hi)]
+    if cfg.method == 'BM':
+        years = hi - lo
+    else:
+        years = ((np.minimum(ends.values, last.to_datetime64()) - np.maximum(starts.values, first.to_datetime64()))
+                 / year.to_timedelta64())
+    fitted = np.flatnonzero(hi - lo >= min_extremes)
+
+    chunks = [fitted[i:i + chunk_size] for i in range(0, len(fitted), chunk_size)]
+    args = [([samples[i] for i in chunk], cfg.Z, cfg.method, cfg.u, np.asarray(years)[chunk],
+             cfg.distribution == 'gumbel_r') for chunk in chunks]
+    if n_jobs == 1:
+        results = [_window_fits(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(_window_fits, *zip(*args)))
+
+    windows = pd.DataFrame({'end': ends, 'n_extremes': hi - lo, 'years': years,
+                            'c': np.nan, 'loc': np.nan, 'scale': np.nan, 'return_period': np.nan},
+                           index=pd.DatetimeIndex(starts, name='start'))
+    for chunk, (params, T) in zip(chunks, results):
+        windows.iloc[chunk, windows.columns.get_loc('c')] = params.get('c', 0.)
+        windows.iloc[chunk, windows.columns.get_loc('loc')] = params.get('loc', cfg.u)
+        windows.iloc[chunk, windows.columns.get_loc('scale')] = params['scale']
+        windows.iloc[chunk, windows.columns.get_loc('return_period')] = T
+    return windows
+
+
+########################################################################################################################
+class EVTState:
+    """
+    Persistent, incrementally updated extremes and fit for an index that is appended to over time (e.g. a daily
+    operational feed), so new data does not mean reprocessing the whole history.
+
+    For block maxima the state holds the maximum of every block, and appended data only updates the (open) last block
+    and adds new ones. For peaks over threshold it holds the closed cluster peaks plus the open cluster at the tail
+    (its peak and last exceedance), which new exceedances either extend or close. Fits are warm started from the
+    previous fit.
+
+    Parameters
+    ----------
+    method : 'BM' or 'POT'
+    Z : return value
+    block_size : block length for BM
+    u : threshold for POT
+    r : declustering window for POT
+    minmax : appended data is multiplied by this (-1 for negative indices, to work in that space)
+    distribution : 'gumbel_r' or 'genextreme' for BM ('genpareto' is always used for POT)
+    """
+    def __init__(self, method='BM', Z=None, block_size='365.2425D', u=None, r='24h', minmax=1,
+                 distribution='gumbel_r'):
+        self.method, self.Z, self.block_size, self.u, self.r = method, Z, block_size, u, r
+        self.minmax, self.distribution = minmax, distribution
+        self.start = self.end = None
+        # Block number (BM only), time and value of each extreme. The last one belongs to the open block/cluster
+        self.blocks = np.zeros(0, dtype=np.int64)
+        self.times = np.zeros(0, dtype='datetime64[ns]')
+        self.values = np.zeros(0)
+        # Last exceedance of the open cluster (POT only)
+        self.lastExceedance = None
+        self.params = None
+
+    @classmethod
+    def from_index(cls, index):
+        """
+        New state for one of the INDICES configurations
+        """
+        cfg = INDICES.loc[index]
+        return cls(method=cfg.method, Z=cfg.Z, block_size=cfg.block_size, u=cfg.u, r=cfg.r, minmax=cfg.minmax,
+                   distribution=cfg.distribution)
+
+    def append(self, times, values):
+        """
+        Add newly arrived data (sorted time stamps, all later than any previously appended)
+        """
+        times = np.asarray(times).astype('datetime64[ns]')
+        values = np.asarray(values, dtype=float) * self.minmax
+        valid = ~np.isnan(values)
+        times, values = times[valid], values[valid]
+        if not len(times):
+            return
+        if self.start is None:
+            self.start = times[0]
+        self.end = times[-1]
+
+        if self.method == 'BM':
+            blocks = (times - self.start) // pd.to_timedelta(self.block_size).to_timedelta64()
+            starts = np.r_[0, np.flatnonzero(np.diff(blocks)) + 1]
+        else:
+            above = values > self.u
+            times, values = times[above], values[above]
+            if not len(times):
+                return
+            gaps = np.diff(times) > pd.to_timedelta(self.r).to_timedelta64()
+            starts = np.r_[0, np.flatnonzero(gaps) + 1]
+            blocks = np.cumsum(np.r_[0, gaps])
+        peaks = _first_max(values, starts)
+        newBlocks, newTimes, newValues = blocks[peaks], times[peaks], values[peaks]
 
-    combined_weights = [0.5 * vw + 0.5 * yw for vw, yw in zip(var_weights, year_weights)]
+        # Does the first new block/cluster continue the open one?
+        if len(self.values):
+            if self.method == 'BM':
+                merge = newBlocks[0] == self.blocks[-1]
+            else:
+                merge = times[0] - self.lastExceedance <= pd.to_timedelta(self.r).to_timedelta64()
+                newBlocks = newBlocks + self.blocks[-1] + (not merge)
+            if merge:
+                # Ties keep the earlier peak, as pyextremes does
+                if newValues[0] > self.values[-1]:
+                    self.times[-1], self.values[-1] = newTimes[0], newValues[0]
+                newBlocks, newTimes, newValues = newBlocks[1:], newTimes[1:], newValues[1:]
 
-    comb_return = sum(t[0] * w for t, w in zip(tuples, combined_weights))
-    var_w = sum(w ** 2 * v for w, v in zip(combined_weights, variances))
-    std_w = np.sqrt(var_w)
+        self.blocks = np.r_[self.blocks, newBlocks]
+        self.times = np.r_[self.times, newTimes]
+        self.values = np.r_[self.values, newValues]
+        if self.method == 'POT':
+            self.lastExceedance = times[-1]
+
+    @property
+    def extremes(self):
+        """
+        Current block maxima or cluster peaks as a Series, in the same form as EVA.extremes
+        """
+        return pd.Series(self.values, index=pd.DatetimeIndex(self.times, name='date-time'), name='extreme values')
+
+    @property
+    def years(self):
+        """
+        Years of data: the number of (annual) blocks for BM, the time span for POT
+        """
+        if self.method == 'BM':
+            return len(self.values)
+        return (self.end - self.start) / np.timedelta64(1, 'D') / 365.2425
+
+    def fit(self):
+        """
+        Refit the distribution, warm started from the previous fit
+
+        Returns
+        -------
+        Dictionary of the fitted parameters and the return period of Z
+        """
+        T, self.params = _return_periods(self.values, self.Z, self.method, self.u, self.years,
+                                         self.distribution == 'gumbel_r', init=self.params)
+        return {**self.params, 'return_period': T}
+
+    def save(self, fn):
+        """
+        Save the state to a .npz file (written to a temporary file first, so an interrupted save leaves the old one)
+        """
+        settings = {k: getattr(self, k) for k in ('method', 'Z', 'block_size', 'u', 'r', 'minmax', 'distribution')}
+        params = {k: float(v) for k, v in (self.params or {}).items()}
+        tmp = f'{fn}.{os.getpid()}.npz'
+        np.savez(tmp, settings=json.dumps(settings, default=lambda x: x.item()), params=json.dumps(params),
+                 start=np.array([self.start, self.end, self.lastExceedance], dtype='datetime64[ns]'),
+                 blocks=self.blocks, times=self.times, values=self.values)
+        os.replace(tmp, fn)
+
+    @classmethod
+    def load(cls, fn):
+        """
+        Load a state saved with save
+        """
+        with np.load(fn) as data:
+            state = cls(**json.loads(str(data['settings'])))
+            state.params = json.loads(str(data['params'])) or None
+            state.start, state.end, state.lastExceedance = [None if np.isnat(t) else t for t in data['start']]
+            state.blocks, state.times, state.values = data['blocks'], data['times'], data['values']
+        return state
+
+
+########################################################################################################################
+def _allComb_weights(estimates, mask, var_weight):
+    """
+    Combination weights of (..., n, 4) EVT estimates: var_weight times the normalised inverse variance weights (the
+    variance from assuming the bounds are a Gaussian 95% interval) plus (1 - var_weight) times the normalised years of
+    data weights. Estimates where mask is False get no weight.
+
+    Returns the weights and the variances, both (..., n)
+    """
+    variances = ((estimates[..., 2] - estimates[..., 1]) / 3.92) ** 2
+    inv_vars = 1 / variances
+    years = estimates[..., 3]
+    if mask is not None:
+        inv_vars = np.where(mask, inv_vars, 0)
+        years = np.where(mask, years, 0)
+
+    var_weights = inv_vars / inv_vars.sum(axis=-1, keepdims=True)
+    year_weights = years / years.sum(axis=-1, keepdims=True)
+    var_weight = np.asarray(var_weight)[..., None]
+    return var_weight * var_weights + (1 - var_weight) * year_weights, variances
+
+
+########################################################################################################################
+def allComb_array(estimates, mask=None, var_weight=0.5):
+    """
+    Weighted combination of EVT estimates, vectorised over any number of scenarios (sets of estimates, subsets and
+    weighting schemes)
+
+    Parameters
+    ----------
+    estimates : (..., n_estimates, 4) array of (value, lower bound, upper bound, years), as the allComb tuples
+    mask : optional boolean (..., n_estimates) array of the estimates to include in each scenario
+    var_weight : weight of the inverse variance weights against the years of data weights (allComb uses 0.5). May be
+                 an array broadcasting against the scenario dimensions, to compare weighting schemes
+
+    Returns
+    -------
+    combined : combined estimates, shape (...)
+    std : their standard deviations, shape (...)
+    """
+    estimates = np.asarray(estimates, dtype=float)
+    weights, variances = _allComb_weights(estimates, mask, var_weight)
+
+    combined = (weights * estimates[..., 0]).sum(axis=-1)
+    std = np.sqrt((weights ** 2 * variances).sum(axis=-1))
+    return combined, std
+
+
+########################################################################################################################
+def allComb_mc(estimates, mask=None, var_weight=0.5, n_samples=1000000, alpha=0.05, seed=None,
+               max_elements=20000000):
+    """
+    Monte Carlo version of allComb_array, which does not assume symmetric Gaussian errors. Each estimate is sampled
+    from a split normal distribution matching its own (asymmetric) interval, i.e. with standard deviations of
+    (value - lower)/1.96 below the value and (upper - value)/1.96 above it, and the weighted combination of the samples
+    is formed. Work is done in blocks of at most max_elements random numbers.
+
+    Parameters
+    ----------
+    estimates : (..., n_estimates, 4) array of (value, lower bound, upper bound, years), as the allComb tuples
+    mask : optional boolean (..., n_estimates) array of the estimates to include in each scenario
+    var_weight : weight of the inverse variance weights against the years of data weights (may be an array)
+    n_samples : number of Monte Carlo samples per scenario
+    alpha : the interval covers 1 - alpha
+    seed : seed for the random number generator
+
+    Returns
+    -------
+    lower, median, upper : percentiles of the combined estimate, each of shape (...)
+    """
+    estimates = np.asarray(estimates, dtype=float)
+    weights, _ = _allComb_weights(estimates, mask, var_weight)
+    shape = weights.shape[:-1]
+    weights = weights.reshape(-1, weights.shape[-1])
+    estimates = np.broadcast_to(estimates, shape + estimates.shape[-2:]).reshape(-1, *estimates.shape[-2:])
+    value = estimates[:, None, :, 0]
+    below = (estimates[:, None, :, 0] - estimates[:, None, :, 1]) / 1.96
+    above = (estimates[:, None, :, 2] - estimates[:, None, :, 0]) / 1.96
+
+    rng = np.random.default_rng(seed)
+    n = weights.shape[-1]
+    # Blocks of scenarios, each holding all of its combined samples, filled by blocks of samples
+    scenarioBlock = max(1, min(len(weights), max_elements // n_samples))
+    sampleBlock = max(1, max_elements // (scenarioBlock * n))
+    q = [100 * alpha / 2, 50, 100 * (1 - alpha / 2)]
+    result = np.empty((3, len(weights)))
+    for i in range(0, len(weights), scenarioBlock):
+        s = slice(i, i + scenarioBlock)
+        combined = np.empty((len(weights[s]), n_samples))
+        for j in range(0, n_samples, sampleBlock):
+            z = rng.standard_normal((len(weights[s]), min(sampleBlock, n_samples - j), n))
+            x = value[s] + z * np.where(z > 0, above[s], below[s])
+            combined[:, j:j + sampleBlock] = np.einsum('kmn,kn->km', x, weights[s])
+        result[:, s] = np.percentile(combined, q, axis=1)
+
+    return tuple(r.reshape(shape) for r in result)
+
+
+########################################################################################################################
+def allComb(*tuples):
+    """
+    Find the weighted combination of a series of EVT estimates
+
+    Parameters
+    ----------
+    tuples: Each tuple should be len 4 (value, lower bound, upper bound, years) eg 1-in-17 (14,18) with 35 years of data
+            would be (17,14,18,35)
+    """
+    comb_return, std_w = allComb_array(np.array(tuples, dtype=float))
 
     print(f'Combination: {comb_return:.1f} ({comb_return - std_w:.1f}, {comb_return + std_w:.1f})')
 
@@ -205,6 +1516,8 @@ if __name__ == "__main__":
 
     # EVT_GEV_Rtn()
     # EVT_GPD_Rtn()
+    # results = EVT_batch(n_boot=10000)
+    # allComb(*results[['return_period', 'lower', 'upper', 'years']].itertuples(index=False))
     allComb((17.2, 14.2, 20.2, 23), (5.4, 3.1, 13.6, 44), (14.6, 5.8, 23.4, 64), (22, 6, 38, 40), (16, 5.6, 26.5, 40),
             (9.3, 4.3, 14.3, 49), (10.5, 4.0, 16.1, 49), (9.8, 5.6, 29.4, 150), (11.3, 8.1, 16.8, 92),
             (16.3, 10.4, 29.7, 39), (11.1, 7.3, 18.9, 39))
\ No newline at end of file
@@ -16,15 +16,34 @@ Created November 2017
 from __future__ import print_function
 import numpy as np
 import datetime as dt
+import json
+import os
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 time = dt.datetime.now()
+here = os.path.dirname(os.path.abspath(__file__))
 
 # How many draw simulations?
-sims = 100000    # 10,000 = ~20s
+sims = 100000    # 10,000 = ~20s with objects, 100,000 = ~5s with arrays
 
 # Which team are you interested in?
 pickedTeam = "England"
 
+# Which tournament? A JSON file of its teams ([name, pot, confederation]), the
+# max number of each confederation allowed per group, the number of groups and
+# the group of each host (see wcDraw_2018.json). The object version of the
+# simulation is for the 2018 draw only
+tournament = os.path.join(here, 'wcDraw_2018.json')
+
+
+def loadTournament(fn):
+    # Tournament definition from a JSON file
+    with open(fn) as f:
+        return json.load(f)
+
+
+wc2018 = loadTournament(os.path.join(here, 'wcDraw_2018.json'))
+
 # Define some objects to hold the team and group information
 class Team():
     def __init__(self, name, pot, fed):
@@ -45,45 +64,12 @@ class Group():
         self.team3 = ''
         self.team4 = ''
         # These are max number of allowed confederation members per group
-        self.feds = Counter(conmebol=1,concacaf=1,afc=1,uefa=2,caf=1)
+        self.feds = Counter(wc2018['caps'])
         
 
 # Define all teams, speciying name, pot number and confederation
-rus = Team("Russia",1,"uefa")
-ger = Team("Germany",1,"uefa")
-bra = Team("Brazil",1,"conmebol")
-por = Team("Portugal",1,"uefa")
-arg = Team("Argentina",1,"conmebol")
-bel = Team("Belgium",1,"uefa")
-pol = Team("Poland",1,"uefa")
-fra = Team("France",1,"uefa")
-spa = Team("Spain",2,"uefa")
-per = Team("Peru",2,"conmebol")
-swi = Team("Switzerland",2,"uefa")
-eng = Team("England",2,"uefa")
-col = Team("Colombia",2,"conmebol")
-mex = Team("Mexico",2,"concacaf")
-uru = Team("Uruguay",2,"conmebol")
-cro = Team("Croatia",2,"uefa")
-den = Team("Denmark",3,"uefa")
-ice = Team("Iceland",3,"uefa")
-cos = Team("Costa Rica",3,"concacaf")
-swe = Team("Sweden",3,"uefa")
-tun = Team("Tunisa",3,"caf")
-egy = Team("Egypt",3,"caf")
-sen = Team("Senegal",3,"caf")
-ira = Team("Iran",3,"afc")
-ser = Team("Serbia",4,"uefa")
-nig = Team("Nigeria",4,"caf")
-aus = Team("Australia",4,"afc")
-jap = Team("Japan",4,"afc")
-mor = Team("Morocco",4,"caf")
-pan = Team("Panama",4,"concacaf")
-kor = Team("Korea Republic",4,"afc")
-sau = Team("Saudi Arabia",4,"afc") 
-
-teams = [rus,ger,bra,por,arg,bel,pol,fra,spa,per,swi,eng,col,mex,uru,cro,den,
-         ice,cos,swe,tun,egy,sen,ira,ser,nig,aus,jap,mor,pan,kor,sau]
+teams = [Team(name, pot, fed) for name, pot, fed in wc2018['teams']]
+rus = teams[0]
 
 # Obvious but needed:
 groupOrder = ['A','B','C','D','E','F','G','H']
@@ -166,7 +152,7 @@ def addToGroups(groups, pot, team):
                 # any negative values then this selection would be impossible
                 remainingDict = spaces.copy()
                 remainingDict.subtract(teamsToPick)
-                if (np.array(remainingDict.values()) < 0).any():
+                if (np.array(list(remainingDict.values())) < 0).any():
                     # Then this wasn't a valid pick. So undo pick and try the
                     # next group
                     setattr(group, team, '')
@@ -179,74 +165,962 @@ def addToGroups(groups, pot, team):
     return groups
             
 
-# Run through the simulations
-for drawNum in np.arange(sims):
-    # In each group at most 2 UEFA teams, 1 CAF, 1 AFC, 1 CONMEBOL and 1 
-    # CONCACAF are allowed
+# The same draw procedure on integer arrays, for many draws at once
+class DrawTables():
+    def __init__(self, names, pots, feds, caps, nGroups, hosts):
+        # Team names, pot numbers and confederation names (one per team), the
+        # max number of members of each confederation allowed per group,
+        # number of groups and the group index (0 = A) of each host team
+        self.names = list(names)
+        self.fedNames = list(caps)
+        self.nGroups = nGroups
+        potNames = sorted(set(pots))
+        self.nPots = len(potNames)
+        self.nFeds = len(self.fedNames)
+        self.pot = np.array([potNames.index(p) for p in pots])
+        self.fed = np.array([self.fedNames.index(f) for f in feds])
+        self.hosts = np.array([self.names.index(h) for h in hosts], dtype=int)
+        self.hostGroups = np.array([hosts[h] for h in hosts], dtype=int)
+        if (np.bincount(self.pot) > nGroups).any():
+            raise ValueError('Pot numbers have gone wrong')
+        if (self.hostGroups >= nGroups).any():
+            raise ValueError('Host group is out of range')
+        # Teams of each pot left to be drawn once the hosts are placed
+        self.pots = [np.array([t for t in range(len(self.names))
+                               if self.pot[t] == p and t not in self.hosts],
+                              dtype=int) for p in range(self.nPots)]
+        # Confederation capacity of each group (groups x feds) and which group
+        # slots of each pot are already filled, before the draw starts
+        self.caps = np.tile([caps[f] for f in self.fedNames], (nGroups, 1))
+        self.filled = np.zeros((self.nPots, nGroups), dtype=bool)
+        for h, g in zip(self.hosts, self.hostGroups):
+            self.caps[g, self.fed[h]] -= 1
+            self.filled[self.pot[h], g] = True
+        self.filledBits = (self.filled << np.arange(self.nPots)[:, None]).sum(axis=0)
+        # Each group's state for the feasibility oracle is packed into one
+        # integer: its capacities in base (max cap + 1), plus the bit mask of
+        # filled slots (from the current pot on) times capBase. The memos map
+        # packed states (as tuples, or the bytes of arrays) to whether the draw
+        # can still be completed, and are emptied when they reach memoSize
+        # entries (a few hundred bytes each), so big tournaments stay in memory
+        self.base = int(self.caps.max()) + 1
+        self.fedPow = [self.base**f for f in range(self.nFeds)]
+        self.capBase = self.base**self.nFeds
+        self.potFeds = [tuple(int(c) for c in
+                              np.bincount(self.fed[pot], minlength=self.nFeds))
+                        for pot in self.pots]
+        self.feasibleMemo = {}
+        self.keyMemo = {}
+        self.memoSize = 2**20
+        # Most moves from one layer of states to the next in drawGraph (up to
+        # ~700k for 2018, while 48 teams would need billions)
+        self.graphSize = 2**20
+        # Every non-empty set of confederations (sets x feds), and which of
+        # them meet each set of confederations given as a bit mask
+        self.fedSets = ((np.arange(1, 2**self.nFeds)[:, None] >>
+                         np.arange(self.nFeds)) & 1).astype(np.float32)
+        self.setsMet = ((np.arange(2**self.nFeds)[:, None] &
+                         np.arange(1, 2**self.nFeds)) > 0).astype(np.float32)
+        # Numbers of each confederation in the pots after each pot
+        self.futureFeds = [np.sum(self.potFeds[p+1:], axis=0, dtype=int)
+                           for p in range(self.nPots)]
+        self.graph = None
+
+    def __getstate__(self):
+        # The memos are only caches, so don't copy them to other processes
+        state = self.__dict__.copy()
+        state['feasibleMemo'], state['keyMemo'], state['graph'] = {}, {}, None
+        return state
+
+
+def feasible(tables, p, codes, rem):
+    # Can the draw still be completed? codes is the sorted tuple of packed
+    # group states during pot p (groups are interchangeable here) and rem the
+    # number of each confederation still to come from pot p. This is an exact
+    # search over placements, memoized on the packed state
+    key = (p, codes, rem)
+    if key in tables.feasibleMemo:
+        return tables.feasibleMemo[key]
+    capBase, base, fedPow = tables.capBase, tables.base, tables.fedPow
+    if not any(rem):
+        # On to the next pot (if there is one)
+        ok = p + 1 == tables.nPots
+        if not ok:
+            nextCodes = tuple(sorted((c // capBase >> 1) * capBase + c % capBase
+                                     for c in codes))
+            ok = feasible(tables, p + 1, nextCodes, tables.potFeds[p + 1])
+    elif p + 1 == tables.nPots:
+        # In the last pot it's a matching of teams to groups, which exists if
+        # every set of confederations left has at least as many open groups
+        # with room for one of them as teams (Hall's theorem)
+        accepts = [sum(1 << f for f in range(len(rem)) if (c // fedPow[f]) % base)
+                   for c in codes if not (c // capBase) & 1]
+        left = sum(1 << f for f, r in enumerate(rem) if r)
+        ok, s = True, left
+        while ok and s:
+            ok = (sum(1 for a in accepts if a & s) >=
+                  sum(r for f, r in enumerate(rem) if s >> f & 1))
+            s = (s - 1) & left
+    else:
+        # Every team left needs its own open group with room for it
+        isOpen = [not (c // capBase) & 1 for c in codes]
+        places = [sum(1 for c, o in zip(codes, isOpen) if o and (c // fedPow[f]) % base)
+                  for f in range(len(rem))]
+        ok = False
+        if all(n >= r for n, r in zip(places, rem)):
+            # Every team left has to go somewhere, so it's enough to try all
+            # the places for one of them (from the most constrained
+            # confederation)
+            f = min((f for f in range(len(rem)) if rem[f]),
+                    key=lambda f: places[f] - rem[f])
+            rem = rem[:f] + (rem[f] - 1,) + rem[f+1:]
+            for i, c in enumerate(codes):
+                if (not isOpen[i] or (c // fedPow[f]) % base == 0 or
+                        (i and c == codes[i-1])):
+                    continue
+                newCodes = codes[:i] + (c + capBase - fedPow[f],) + codes[i+1:]
+                if feasible(tables, p, tuple(sorted(newCodes)), rem):
+                    ok = True
+                    break
+    if len(tables.feasibleMemo) >= tables.memoSize:
+        tables.feasibleMemo.clear()
+    tables.feasibleMemo[key] = ok
+    return ok
+
+
+def firstFeasible(tables, p, codes, rem, f):
+    # The group (index) a pick from confederation f goes in: the first with an
+    # empty slot for pot p and room for f, from which the draw can still be
+    # completed (-1 if there isn't one). codes are the packed group states in
+    # group order and rem the numbers of each confederation to come after the
+    # pick
+    capBase, fedPow = tables.capBase, tables.fedPow
+    for i, c in enumerate(codes):
+        if (c // capBase) & 1 or (c // fedPow[f]) % tables.base == 0:
+            continue
+        newCodes = codes[:i] + (c + capBase - fedPow[f],) + codes[i+1:]
+        if feasible(tables, p, tuple(sorted(newCodes)), rem):
+            return i
+    return -1
+
+
+def completion(tables, p, codes, rem):
+    # One way to finish the draw from pot p, found with the oracle: the
+    # confederation planned for each slot (pots x groups, -1 for slots filled
+    # or left empty), up to the pot before the last (any plan the oracle
+    # allows leaves a last pot that can be completed), or None if there isn't
+    # one. codes are the packed group states in group order and rem the
+    # numbers of each confederation still to come from pot p
+    capBase, fedPow = tables.capBase, tables.fedPow
+    plan = np.full((tables.nPots, tables.nGroups), -1, dtype=np.int8)
+    codes = [int(c) for c in codes]
+    rem = list(rem)
+    for q in range(p, tables.nPots - 1):
+        if q > p:
+            codes = [(c // capBase >> 1) * capBase + c % capBase for c in codes]
+            rem = list(tables.potFeds[q])
+        for f in range(tables.nFeds):
+            while rem[f]:
+                rem[f] -= 1
+                i = firstFeasible(tables, q, tuple(codes), tuple(rem), f)
+                if i < 0:
+                    return None
+                codes[i] += capBase - fedPow[f]
+                plan[q, i] = f
+    return plan
+
+
+def feasibleRows(tables, p, keys):
+    # feasible() for each row of an int32 array of the sorted codes followed by
+    # the numbers to come. Rows are memoized by their bytes, so batches of draws
+    # skip building tuples
+    memo = tables.keyMemo.setdefault(p, {})
+    rows = keys.view((np.void, keys.shape[1]*keys.itemsize)).ravel().tolist()
+    good = [memo.get(row) for row in rows]
+    for i, ok in enumerate(good):
+        if ok is None:
+            key = keys[i].tolist()
+            G = tables.nGroups
+            if len(memo) >= tables.memoSize:
+                memo.clear()
+            good[i] = memo[rows[i]] = feasible(tables, p, tuple(key[:G]),
+                                               tuple(key[G:]))
+    return np.array(good, dtype=bool)
+
+
+def hallHolds(tables, left, isOpen, need):
+    # Can the teams of a pot (need: the number of them in each set of
+    # confederations, from fedSets) be matched to the groups (isOpen: n x
+    # groups, whether each has a slot for them; left: n x groups x feds, the
+    # room in each for each confederation)? By Hall's theorem, if every set of
+    # confederations has at least as many groups open to it as teams
+    masks = ((left > 0) & isOpen[:, :, None]) @ (1 << np.arange(tables.nFeds))
+    # Numbers of groups open to each set of confederations, from the numbers
+    # of groups open to exactly each set
+    n = 2**tables.nFeds
+    exactly = np.bincount((np.arange(len(masks))[:, None] * n + masks).ravel(),
+                          minlength=len(masks) * n).reshape(-1, n)
+    return (exactly.astype(np.float32) @ tables.setsMet >= need).all(axis=1)
+
+
+def plannedCounts(tables, planned):
+    # Numbers of each confederation planned for each group (draws x groups x
+    # feds) by some plans (draws x pots x groups)
+    n, _, G = planned.shape
+    F = tables.nFeds
+    slot = (np.arange(n)[:, None, None] * G + np.arange(G)) * F + planned
+    return np.bincount(slot[planned >= 0], minlength=n*G*F).reshape(n, G, F).astype(np.int8)
+
+
+def followPlan(tables, p, plan, caps, filled, rows, g, f):
+    # Update the planned completions (draws x pots x groups, from completion)
+    # of some draws (rows) for picks from confederation f going in group g
+    # during pot p, where the plan can follow by swapping the planned teams of
+    # g and another group (g itself if it was planned an f) for some of the
+    # pots from p on, including p, or by rotating this pot's planned teams
+    # around g and two other groups. The plans leave out the last pot, which
+    # only needs Hall's condition to hold. Returns whether each plan was kept,
+    # which proves the draw can still be completed
+    P, G = tables.nPots, tables.nGroups
+    allRows, allG, allF = rows, g, f
+    h = plan[rows, p, g]
+    kept = h == f
+    plan[rows[kept], p, g[kept]] = -1
+    # Most of the rest swap just this pot's teams with another group
+    rest = np.flatnonzero(~kept)
+    rows, g, f, h = rows[rest], g[rest], f[rest], h[rest]
+    i = np.arange(len(rows))
+    planned = plan[rows]
+    counts = plannedCounts(tables, planned)
+    left = caps[rows] - counts
+    leftH = left[i[:, None], np.arange(G), np.maximum(h, 0)[:, None]]
+    swap = ((planned[:, p] == f[:, None]) & (left[i, g, f] > 0)[:, None] &
+            ((h < 0)[:, None] | (leftH > 0)))
+    lastOpen = (filled[rows] >> (P - 1 - p)) & 1 == 0
+    need = tables.fedSets @ tables.potFeds[-1]
+    check = i[swap.any(axis=1)]
+    while check.size:
+        k = swap[check].argmax(axis=1)
+        j = np.arange(check.size)
+        new = left[check]
+        new[j, g[check], f[check]] -= 1
+        new[j, k, f[check]] += 1
+        hasH = h[check] >= 0
+        new[j[hasH], g[check][hasH], h[check][hasH]] += 1
+        new[j[hasH], k[hasH], h[check][hasH]] -= 1
+        good = hallHolds(tables, new, lastOpen[check], need)
+        r = rows[check[good]]
+        plan[r, p, k[good]] = h[check[good]]
+        plan[r, p, g[check[good]]] = -1
+        kept[rest[check[good]]] = True
+        swap[check[~good], k[~good]] = False
+        check = check[~good]
+        check = check[swap[check].any(axis=1)]
+    # Then swaps over more pots
+    swaps = np.array([[q == p or (p < q < P - 1 and (s >> (q - p - 1)) & 1)
+                       for q in range(P)] for s in range(1, 2**(P - p - 2))],
+                     dtype=bool).reshape(-1, P)
+    swaps = swaps[np.argsort(swaps.sum(axis=1), kind='stable')]
+    rest = np.flatnonzero(~kept)
+    if rest.size and swaps.size:
+        kept[rest] = swapPlans(tables, p, plan, caps, filled, allRows[rest], allG[rest],
+                               allF[rest], swaps)
+    # Then rotations of this pot's teams around three groups
+    rest = np.flatnonzero(~kept)
+    if rest.size:
+        kept[rest] = cyclePlans(tables, p, plan, caps, filled, allRows[rest],
+                                allG[rest], allF[rest])
+    return kept
+
+
+def swapPlans(tables, p, plan, caps, filled, rows, g, f, swaps):
+    # The swaps for followPlan, over the given sets of pots (sets x pots, in
+    # the order they're tried)
+    P, G = tables.nPots, tables.nGroups
+    i = np.arange(len(rows))
+    planned = plan[rows]
+    isOpen = (filled[rows, None, :] >> np.maximum(np.arange(P) - p, 0)[:, None]) & 1 == 0
+    # Planned numbers of each confederation in each group, in total and over
+    # each set of pots (draws x sets x groups x feds)
+    counts = (planned[..., None] == np.arange(tables.nFeds)).astype(np.int8)
+    inSwap = np.einsum('sq,nqgf->nsgf', swaps.astype(np.int8), counts)
+    counts = counts.sum(axis=1, dtype=np.int8)
+    fromG = inSwap[i, :, g][:, :, None]
+    ok = ((counts[i, g][:, None, None] - fromG + inSwap <= caps[rows, g][:, None, None]) &
+          (counts[:, None] - inSwap + fromG <= caps[rows][:, None]) &
+          (planned[:, p] == f[:, None])[:, None, :, None]).all(axis=3)
+    # Every planned team has to land in an open slot
+    hasTeam = planned >= 0
+    ok &= ~np.einsum('sq,nqg->nsg', swaps.astype(np.int8),
+                     (hasTeam & ~isOpen[i, :, g][:, :, None]) |
+                     (hasTeam[i, :, g][:, :, None] & ~isOpen)).astype(bool)
+    ok = ok.reshape(len(rows), -1)
+    # Check the last pot for the first swap of each draw, moving on to the
+    # next swap if it fails
+    choice = np.full(len(rows), -1)
+    need = tables.fedSets @ tables.potFeds[-1]
+    check = i[ok.any(axis=1)]
+    while check.size:
+        c = ok[check].argmax(axis=1)
+        s, k = np.divmod(c, G)
+        j = np.arange(check.size)
+        left = caps[rows[check]] - counts[check]
+        left[j, g[check]] -= inSwap[check, s, k] - inSwap[check, s, g[check]]
+        left[j, k] -= inSwap[check, s, g[check]] - inSwap[check, s, k]
+        good = hallHolds(tables, left, isOpen[check, -1], need)
+        choice[check[good]] = c[good]
+        ok[check[~good], c[~good]] = False
+        check = check[~good]
+        check = check[ok[check].any(axis=1)]
+    swapped = choice >= 0
+    s, other = np.divmod(choice[swapped], G)
+    r, g = rows[swapped], g[swapped]
+    mine, theirs = plan[r, :, g], plan[r, :, other]
+    plan[r, :, g] = np.where(swaps[s], theirs, mine)
+    plan[r, :, other] = np.where(swaps[s], mine, theirs)
+    plan[r, p, g] = -1
+    return swapped
+
+
+def cyclePlans(tables, p, plan, caps, filled, rows, g, f):
+    # The three group rotations of rotatePlan for many draws at once: g takes
+    # an f from group a, which takes group b's planned team, b taking g's.
+    # Returns whether each plan was kept
+    P, G = tables.nPots, tables.nGroups
+    i = np.arange(len(rows))
+    mine = plan[rows, p]
+    counts = plannedCounts(tables, plan[rows])
+    left = caps[rows] - counts
+    h = mine[i, g]
+    fromB = np.maximum(mine, 0)
+    # Room in a for b's team (a x b) and in b for g's team
+    aTakes = (mine < 0)[:, None, :] | (
+        np.take_along_axis(left, np.broadcast_to(fromB[:, None, :], (len(rows), G, G)),
+                           axis=2) + (mine[:, None, :] == f[:, None, None]) > 0)
+    bTakes = (h < 0)[:, None] | (
+        left[i[:, None], np.arange(G), np.maximum(h, 0)[:, None]] + (mine == h[:, None]) > 0)
+    isOpen = (filled[rows] & 1) == 0
+    notG = np.arange(G) != g[:, None]
+    ok = (((mine == f[:, None]) & notG)[:, :, None] & aTakes &
+          (bTakes & isOpen & notG)[:, None, :] & ~np.eye(G, dtype=bool) &
+          (left[i, g, f] > 0)[:, None, None]).reshape(len(rows), -1)
+    lastOpen = (filled[rows] >> (P - 1 - p)) & 1 == 0
+    need = tables.fedSets @ tables.potFeds[-1]
+    kept = np.zeros(len(rows), dtype=bool)
+    check = i[ok.any(axis=1)]
+    while check.size:
+        a, b = np.divmod(ok[check].argmax(axis=1), G)
+        j = np.arange(check.size)
+        new = mine[check]
+        new[j, a], new[j, b] = new[j, b], h[check]
+        new[j, g[check]] = f[check]
+        new = left[check] + (mine[check][..., None] == np.arange(tables.nFeds)) - (
+            new[..., None] == np.arange(tables.nFeds))
+        good = hallHolds(tables, new, lastOpen[check], need)
+        r = rows[check[good]]
+        plan[r, p, a[good]] = mine[check[good], b[good]]
+        plan[r, p, b[good]] = h[check[good]]
+        plan[r, p, g[check[good]]] = -1
+        kept[check[good]] = True
+        ok[check[~good], a[~good] * G + b[~good]] = False
+        check = check[~good]
+        check = check[ok[check].any(axis=1)]
+    return kept
+
+
+def rotatePlan(tables, p, plan, caps, filled, g, f):
+    # followPlan for one draw (plan is pots x groups, caps groups x feds and
+    # filled the bit mask of filled slots from pot p on) when none of its
+    # swaps or rotations work: try rotating this pot's planned teams around
+    # any cycle of groups instead, g taking an f from a group which takes
+    # another's team and so on, the last taking g's. Cycles are tried shortest
+    # first (along a breadth first search), each checked against the last pot
+    # as in followPlan. Returns whether the plan was kept
+    G = tables.nGroups
+    mine = plan[p].copy()
+    counts = (plan[..., None] == np.arange(tables.nFeds)).sum(axis=0)
+    isOpen = (filled & 1) == 0
+    lastOpen = (filled >> (tables.nPots - 1 - p)) & 1 == 0
+    need = tables.fedSets @ tables.potFeds[-1]
+
+    def takes(a, y):
+        # Can group a have an y (-1 for none) instead of its planned team?
+        return y < 0 or counts[a, y] + (mine[a] != y) <= caps[a, y]
+
+    if not takes(g, f):
+        return False
+    paths = [(g, a) for a in range(G) if a != g and mine[a] == f]
+    seen = {g} | {a for _, a in paths}
+    while paths:
+        longer = []
+        for path in paths:
+            if takes(path[-1], mine[g]):
+                # Rotate and check the last pot
+                new = mine.copy()
+                new[list(path)] = mine[list(path[1:]) + [g]]
+                left = caps - counts
+                for a in path:
+                    if mine[a] >= 0:
+                        left[a, mine[a]] += 1
+                    if new[a] >= 0:
+                        left[a, new[a]] -= 1
+                if hallHolds(tables, left[None], lastOpen[None], need)[0]:
+                    plan[p] = new
+                    plan[p, g] = -1
+                    return True
+            for a in range(G):
+                if a not in seen and isOpen[a] and takes(path[-1], mine[a]):
+                    seen.add(a)
+                    longer.append(path + (a,))
+        paths = longer
+    return False
+
+
+def placePicks(tables, p, caps, filled, f, toCome, exact=True, plan=None):
+    # Where a batch of picks go during pot p: the first group (alphabetically)
+    # with an empty slot for this pot and room for the pick's confederation f,
+    # from which the draw can still be completed. caps are the capacities left
+    # (n x groups x feds), filled the bit masks of filled slots from pot p on
+    # (n x groups) and toCome the numbers of each confederation still to come
+    # from the pot after the pick (n x feds). With exact=False the feasibility
+    # is decided by the same look-ahead as addToGroups (which only looks at the
+    # current pot and can dead-end) instead of the oracle. With a plan of how
+    # each draw can be completed (see followPlan) the oracle is only needed
+    # when the plan can't follow the pick, and the plans are kept up to date.
+    # Returns the group index and whether there was one
+    rows = np.arange(len(f))
+    isOpen = filled & 1 == 0
+    # Spaces for each confederation among the groups with an empty slot (each
+    # can only take one more team from this pot)
+    eff = ((caps > 0) & isOpen[:, :, None]).view(np.int8)
+    spaces = eff.sum(axis=1, dtype=np.int8)
+    # Groups the pick can go in without making the rest of the pot impossible
+    # (by this count)
+    ok = (isOpen & (caps[rows, :, f] > 0) &
+          (spaces[:, None, :] - eff >= toCome[:, None, :]).all(axis=2))
+    g = ok.argmax(axis=1)
+    placed = ok[rows, g]
+    if exact:
+        # The count is necessary for the draw to be completed, so the oracle
+        # only has to confirm its first choice, or rule it out and move on to
+        # the next (only a few picks need this)
+        fedPow = np.array(tables.fedPow)
+        check = rows[placed]
+        while check.size:
+            i = np.arange(check.size)
+            if p + 1 == tables.nPots:
+                # In the last pot it's a matching of the teams left to the
+                # groups left
+                left = isOpen[check]
+                left[i, g[check]] = False
+                good = hallHolds(tables, caps[check], left, toCome[check] @ tables.fedSets.T)
+            else:
+                good = np.zeros(check.size, dtype=bool)
+                if plan is not None:
+                    good = followPlan(tables, p, plan, caps, filled, check, g[check], f[check])
+                    for j in np.flatnonzero(~good):
+                        r = check[j]
+                        good[j] = rotatePlan(tables, p, plan[r], caps[r], filled[r], g[r], f[r])
+                ask = np.flatnonzero(~good)
+                newCodes = filled[check[ask]] * tables.capBase + caps[check[ask]] @ fedPow
+                newCodes[np.arange(ask.size), g[check[ask]]] += (tables.capBase -
+                                                                 fedPow[f[check[ask]]])
+                keys = np.ascontiguousarray(np.c_[np.sort(newCodes, axis=1),
+                                                  toCome[check[ask]]], dtype=np.int32)
+                good[ask] = feasibleRows(tables, p, keys)
+                if plan is not None:
+                    # New plans for the draws the oracle confirmed
+                    for r, c in zip(check[ask][good[ask]], newCodes[good[ask]]):
+                        plan[r] = completion(tables, p, c, toCome[r])
+            check = check[~good]
+            ok[check, g[check]] = False
+            g[check] = ok[check].argmax(axis=1)
+            placed[check] = ok[check, g[check]]
+            check = check[placed[check]]
+    return g, placed
+
+
+def drawBatch(tables, n, rng, exact=True):
+    # Run n draws at once. Each pot is drawn in a random order and each pick
+    # is placed by placePicks, which keeps a plan of how each draw can be
+    # completed (all the same to begin with). Returns the group index of every
+    # team in every draw (n x teams) and whether each draw completed (always,
+    # unless exact=False)
+    F = tables.nFeds
+    plan = None
+    if exact:
+        plan = completion(tables, 0, tables.filledBits * tables.capBase +
+                          tables.caps @ np.array(tables.fedPow), tables.potFeds[0])
+        if plan is None:
+            raise ValueError('No complete draw is possible')
+        plan = np.repeat(plan[None], n, axis=0)
+    rows = np.arange(n)
+    caps = np.repeat(tables.caps[None].astype(np.int8), n, axis=0)
+    groupOf = np.full((n, len(tables.names)), -1, dtype=np.int8)
+    groupOf[:, tables.hosts] = tables.hostGroups
+    filledBits = np.repeat(tables.filledBits[None], n, axis=0)
+    valid = np.ones(n, dtype=bool)
+    oneHot = np.eye(F, dtype=np.int8)
+    for p, pot in enumerate(tables.pots):
+        order = pot[np.argsort(rng.random((n, len(pot))), axis=1)]
+        fed = tables.fed[order]
+        # Numbers of each confederation still to be picked after each pick
+        toCome = oneHot[fed][:, ::-1].cumsum(axis=1)[:, ::-1] - oneHot[fed]
+        for k in range(len(pot)):
+            g, placed = placePicks(tables, p, caps, filledBits >> p, fed[:, k],
+                                   toCome[:, k], exact, plan)
+            valid &= placed
+            r, g, f = rows[placed], g[placed], fed[placed, k]
+            caps[r, g, f] -= 1
+            filledBits[r, g] |= 1 << p
+            groupOf[r, order[placed, k]] = g
+    return groupOf, valid
+
+
+def batchSeed(seed, i):
+    # Seed of the i'th batch of draws: the same as seed.spawn()'s i'th child,
+    # but without needing the ones before it
+    return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (i,),
+                                  pool_size=seed.pool_size)
+
+
+def simulateBatch(tables, n, seed, exact=True):
+    # Counts for one batch of n draws, from its own random stream: how many
+    # times each pair of teams is in the same group (teams x teams) and each
+    # team is in each group (teams x groups), and the number of completed draws
+    groupOf, valid = drawBatch(tables, n, np.random.default_rng(seed), exact)
+    inGroup = groupOf[valid, :, None] == np.arange(tables.nGroups)
+    letters = inGroup.sum(axis=0)
+    # Stack the draws' groups as rows (of which teams are in them), so every
+    # pair in every group is counted by one matrix product
+    rows = inGroup.transpose(0, 2, 1).reshape(-1, len(tables.names))
+    rows = rows.astype(np.float32)
+    cogroup = np.rint(rows.T @ rows).astype(np.int64)
+    return cogroup, letters, valid.sum()
+
+
+def workerInit(drawTables):
+    # Each worker process gets its own copy of the tables (and memos)
+    global workerTables
+    workerTables = drawTables
+
+
+def workerBatch(n, seed, exact):
+    return simulateBatch(workerTables, n, seed, exact)
+
+
+def runBatches(tables, pool, sizes, seeds, exact):
+    # Summed counts (see simulateBatch) of batches of draws, in this process
+    # (pool=None) or on a process pool set up with workerInit
+    n = len(sizes)
+    if pool is None:
+        results = map(simulateBatch, [tables]*n, sizes, seeds, [exact]*n)
+    else:
+        results = pool.map(workerBatch, sizes, seeds, [exact]*n)
+    cogroup, letters, nValid = [sum(counts) for counts in zip(*results)]
+    return cogroup, letters, nValid
+
 
-    # 8 groups
-    groupA,groupB,groupC,groupD=Group('A'),Group('B'),Group('C'),Group('D')
-    groupE,groupF,groupG,groupH=Group('E'),Group('F'),Group('G'),Group('H')
-    groups = [groupA,groupB,groupC,groupD,groupE,groupF,groupG,groupH]
+def simulateAll(tables, sims, batchSize=10000, seed=None, exact=True, nJobs=1):
+    # Array version of the simulation loop, for every team at once: how many
+    # times each pair of teams is in the same group (teams x teams) and each
+    # team is in each group (teams x groups), along with the number of
+    # completed draws (all of them, unless exact=False). Each batch of draws
+    # has its own random stream spawned from seed (an int or SeedSequence), so
+    # for a given seed the totals are the same for any number of worker
+    # processes nJobs (None for one per CPU)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    sizes = [min(batchSize, sims - start) for start in range(0, sims, batchSize)]
+    seeds = [batchSeed(seed, i) for i in range(len(sizes))]
+    if nJobs == 1:
+        return runBatches(tables, None, sizes, seeds, exact)
+    with ProcessPoolExecutor(max_workers=nJobs, initializer=workerInit,
+                             initargs=(tables,)) as pool:
+        return runBatches(tables, pool, sizes, seeds, exact)
+
+
+def simulate(tables, sims, team, batchSize=10000, seed=None, exact=True,
+             nJobs=1):
+    # How many times each team is in the same group as team, along with the
+    # number of completed draws (see simulateAll)
+    cogroup, letters, nValid = simulateAll(tables, sims, batchSize, seed, exact,
+                                           nJobs)
+    return cogroup[tables.names.index(team)], nValid
+
+
+def printProgress(progress):
+    # Default progress report for simulateUntil
+    print('{sims} draws, largest standard error {maxSE:.5f}, '
+          '{drawsPerSecond:.0f} draws/s'.format(**progress))
+
+
+def saveCheckpoint(fn, seed, batchSize, exact, sims, batch, counts):
+    # Write the state of a simulateUntil run to fn (an .npz file) atomically,
+    # so a crash while writing leaves the previous checkpoint in place
+    tmp = fn + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, entropy=str(seed.entropy), spawnKey=np.array(seed.spawn_key, dtype=np.int64),
+                 poolSize=seed.pool_size, batchSize=batchSize, exact=exact,
+                 sims=sims, batch=batch, cogroup=counts[0], letters=counts[1],
+                 nValid=counts[2])
+    os.replace(tmp, fn)
+
+
+def loadCheckpoint(fn):
+    # State of a simulateUntil run saved by saveCheckpoint
+    with np.load(fn) as data:
+        seed = np.random.SeedSequence(int(str(data['entropy'])),
+                                      spawn_key=tuple(data['spawnKey'].tolist()),
+                                      pool_size=int(data['poolSize']))
+        counts = [data['cogroup'], data['letters'], int(data['nValid'])]
+        return (seed, int(data['batchSize']), bool(data['exact']),
+                int(data['sims']), int(data['batch']), counts)
+
+
+def simulateUntil(tables, target=0.001, team=None, batchSize=10000, seed=None,
+                  exact=True, nJobs=1, maxSims=10**8, callback=printProgress,
+                  checkpoint=None, checkpointEvery=60):
+    # Simulate (as simulateAll) until the standard error of every tracked
+    # probability (of being in the same group as team, or of every pair of
+    # teams if team is None) is below target, or maxSims draws. After every
+    # round of batches (one per worker) callback (if any) gets a dict of the
+    # number of draws so far (sims), the tracked probabilities (probability)
+    # with their 95% confidence intervals (lower, upper), the largest standard
+    # error (maxSE) and the draws per second (drawsPerSecond). The batches and
+    # their random streams are the same as simulateAll's, so stopping after N
+    # draws gives the same totals as simulateAll(tables, N).
+    # With checkpoint (an .npz file name) the counts, the number of draws and
+    # batches so far and the seed are saved there every checkpointEvery
+    # seconds and at the end, and a run that finds the file carries on from
+    # it (with its seed, batch size and exact setting) exactly as if it had
+    # never stopped
+    if checkpoint is not None and os.path.exists(checkpoint):
+        seed, batchSize, exact, sims, batch, counts = loadCheckpoint(checkpoint)
+    else:
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        sims, batch = 0, 0
+        counts = [np.zeros((len(tables.names),)*2, dtype=np.int64),
+                  np.zeros((len(tables.names), tables.nGroups), dtype=np.int64), 0]
+    nRound = 1 if nJobs == 1 else (nJobs or os.cpu_count())
+    start = saved = dt.datetime.now()
+    startSims = sims
+
+    def run(pool, sims, batch, saved):
+        while sims < maxSims:
+            sizes = [min(batchSize, maxSims - sims - i*batchSize) for i in range(nRound)]
+            sizes = [size for size in sizes if size > 0]
+            seeds = [batchSeed(seed, batch + i) for i in range(len(sizes))]
+            for i, batchCounts in enumerate(runBatches(tables, pool, sizes, seeds, exact)):
+                counts[i] += batchCounts
+            sims += sum(sizes)
+            batch += len(sizes)
+
+            tracked = counts[0] if team is None else counts[0][tables.names.index(team)]
+            p = tracked / float(counts[2])
+            se = np.sqrt(p * (1 - p) / counts[2])
+            now = dt.datetime.now()
+            if checkpoint is not None and (now - saved).total_seconds() >= checkpointEvery:
+                saveCheckpoint(checkpoint, seed, batchSize, exact, sims, batch, counts)
+                saved = now
+            if callback is not None:
+                callback(dict(sims=sims, probability=p, lower=np.clip(p - 1.96*se, 0, 1),
+                              upper=np.clip(p + 1.96*se, 0, 1), maxSE=se.max(),
+                              drawsPerSecond=(sims - startSims) /
+                              max((now - start).total_seconds(), 1e-9)))
+            if se.max() < target:
+                break
+        return sims, batch
+
+    if nJobs == 1:
+        sims, batch = run(None, sims, batch, saved)
+    else:
+        with ProcessPoolExecutor(max_workers=nJobs, initializer=workerInit,
+                                 initargs=(tables,)) as pool:
+            sims, batch = run(pool, sims, batch, saved)
+    if checkpoint is not None:
+        saveCheckpoint(checkpoint, seed, batchSize, exact, sims, batch, counts)
+    return tuple(counts)
+
+
+def probabilityTables(tables, cogroup, letters, nValid=1):
+    # Co-group and group letter counts (or, with nValid=1, probabilities) as
+    # DataFrames of percentages, labelled by team name and group letter
+    import pandas as pd
+    letterNames = [chr(ord('A') + g) for g in range(tables.nGroups)]
+    return (pd.DataFrame(cogroup * 100. / nValid, index=tables.names,
+                         columns=tables.names),
+            pd.DataFrame(letters * 100. / nValid, index=tables.names,
+                         columns=letterNames))
+
+
+def reduceCodes(tables, p, codes, rem):
+    # Cap each group's capacities at the number of its slots still to fill and
+    # the number of each confederation still to come (from pot p on, with rem
+    # left in pot p). That changes nothing about the rest of the draw, but many
+    # more states become the same
+    nLeft = tables.nPots - p
+    mask = codes // tables.capBase
+    caps = codes[:, :, None] // tables.fedPow % tables.base
+    slots = nLeft - ((mask[:, :, None] >> np.arange(nLeft)) & 1).sum(axis=2)
+    left = rem + tables.futureFeds[p]
+    caps = np.minimum(caps, np.minimum(slots[:, :, None], left[:, None, :]))
+    return mask * tables.capBase + caps @ tables.fedPow
+
+
+def uniqueRows(keys):
+    # np.unique(keys, axis=0, return_inverse=True) for small non-negative int
+    # rows, packing each row into one int64 when it fits (much faster to sort)
+    ranks = [np.unique(col, return_inverse=True) for col in keys.T]
+    sizes = [len(values) for values, _ in ranks]
+    if np.sum(np.log2(sizes)) >= 62:
+        states, inverse = np.unique(keys, axis=0, return_inverse=True)
+        return states, inverse.ravel()
+    packed = np.zeros(len(keys), dtype=np.int64)
+    for (values, inverse), size in zip(ranks, sizes):
+        packed = packed * size + inverse.ravel()
+    first, inverse = np.unique(packed, return_index=True, return_inverse=True)[1:]
+    return keys[first], inverse.ravel()
+
+
+def drawGraph(tables):
+    # Every state the draw can go through, as a chain of layers (one per pick)
+    # of the distinct states (packed group states, numbers of each
+    # confederation still to come from the pot) and the moves between them.
+    # Every pick is uniformly random among the teams left in its pot, and
+    # teams of the same pot and confederation are interchangeable, so a move
+    # is a confederation coming out (with its probability) and the group
+    # placePicks puts it in. Along with it, the expected future occupancy of
+    # each group by each class (pot and confederation, from the state's pot
+    # on) from each state, from a backward pass. Built once and kept with the
+    # tables. Raises a ValueError if a layer has more than graphSize moves,
+    # rather than running out of memory
+    if tables.graph is not None:
+        return tables.graph
+    G, F, P = tables.nGroups, tables.nFeds, tables.nPots
+    capBase, fedPow = tables.capBase, np.array(tables.fedPow)
+    oneHot = np.eye(F, dtype=int)
+    rem = np.array([tables.potFeds[0]])
+    codes = reduceCodes(tables, 0, (tables.filledBits * capBase +
+                                    tables.caps @ fedPow)[None], rem)
+    if not feasible(tables, 0, tuple(sorted(codes[0].tolist())), tables.potFeds[0]):
+        raise ValueError('No complete draw is possible')
+    layers, moves = [(0, np.c_[codes, rem])], []
+    for p, pot in enumerate(tables.pots):
+        for k in range(len(pot)):
+            # Every state, followed by each confederation that could come next
+            parent, f = np.nonzero(rem)
+            if len(f) > tables.graphSize:
+                raise ValueError('Too many states for exact probabilities')
+            prob = rem[parent, f] / rem[parent].sum(axis=1)
+            after = rem[parent] - oneHot[f]
+            c = codes[parent]
+            caps = (c[:, :, None] // fedPow % tables.base).astype(np.int8)
+            g, _ = placePicks(tables, p, caps, c // capBase, f, after)
+            c[np.arange(len(f)), g] += capBase - fedPow[f]
+            q = p
+            if k == len(pot) - 1 and p + 1 < P:
+                # On to the next pot
+                q = p + 1
+                c = (c // capBase >> 1) * capBase + c % capBase
+                after = np.repeat([tables.potFeds[q]], len(f), axis=0)
+            c = reduceCodes(tables, q, c, after)
+            states, child = uniqueRows(np.c_[c, after])
+            layers.append((q, states))
+            moves.append((parent.astype(np.int32), child.astype(np.int32),
+                          f.astype(np.int8), g.astype(np.int8), prob))
+            codes, rem = states[:, :G], states[:, G:]
+
+    # Backward: future occupancy from each state (states x groups x classes
+    # from its pot on)
+    futures = [np.zeros((len(codes), G, (P - layers[-1][0])*F))]
+    for (p, _), (parent, child, f, g, prob) in zip(layers[-2::-1], moves[::-1]):
+        future = futures[0]
+        if future.shape[2] < (P - p)*F:
+            future = np.concatenate([np.zeros((len(future), G, F)), future], axis=2)
+        new = future[child] * prob[:, None, None]
+        new[np.arange(len(f)), g, f] += prob
+        # The moves are in order of parent state
+        starts = np.r_[0, np.flatnonzero(np.diff(parent)) + 1]
+        futures.insert(0, np.add.reduceat(new, starts, axis=0))
+    tables.graph = layers, moves, futures
+    return tables.graph
+
+
+def conditionalProbabilities(tables, placed=()):
+    # Exact probabilities of each pair of teams being in the same group (teams
+    # x teams) and of each team being in each group (teams x groups), given
+    # the teams placed so far (team name: group letter, or (name, letter)
+    # pairs, besides the hosts) of a draw made as in drawBatch. The first call
+    # builds the draw's graph of states (~20s for 2018), after which every
+    # state is a forward pass over the part of the graph still to come
+    G, F, P = tables.nGroups, tables.nFeds, tables.nPots
+    layers, moves, futures = drawGraph(tables)
+    groupOf = np.full(len(tables.names), -1)
+    groupOf[tables.hosts] = tables.hostGroups
+    for team, group in dict(placed).items():
+        groupOf[tables.names.index(team)] = ord(group) - ord('A')
+    known = groupOf >= 0
+    classOf = tables.pot*F + tables.fed
+
+    # The state of the draw: the pot being drawn is the first with teams left
+    left = np.bincount(classOf[~known], minlength=P*F).reshape(P, F)
+    p = min(np.flatnonzero(left.sum(axis=1)), default=P - 1)
+    caps = tables.caps.copy()
+    filled = tables.filledBits.copy()
+    for t in np.setdiff1d(np.flatnonzero(known), tables.hosts):
+        caps[groupOf[t], tables.fed[t]] -= 1
+        filled[groupOf[t]] |= 1 << tables.pot[t]
+    if (caps < 0).any() or (np.bincount(groupOf[known] * P + tables.pot[known])
+                            > 1).any():
+        raise ValueError('Too many teams in a group')
+    codes = (filled >> p) * tables.capBase + caps @ tables.fedPow
+    codes = reduceCodes(tables, p, codes[None], left[p][None])
+    k = int(known.sum()) - len(tables.hosts)
+    states = layers[k][1]
+    i = np.flatnonzero((states == np.r_[codes[0], left[p]]).all(axis=1))
+    if layers[k][0] != p or not i.size:
+        raise ValueError('The draw can not reach this state')
+
+    # Forward pass from the state: expected occupancy of each group by each
+    # class and the expected number of same group pairs of classes (earlier
+    # pick x later pick) over the rest of the draw
+    oneHot = np.eye(F)
+    occ = np.zeros((G, P*F))
+    pair = np.zeros((P*F, P*F))
+    mass = np.zeros(len(states))
+    mass[i] = 1
+    for (p, _), (q, states), future, (parent, child, f, g, prob) in zip(
+            layers[k:], layers[k+1:], futures[k+1:], moves[k:]):
+        weight = mass[parent] * prob
+        reached = np.flatnonzero(weight)
+        weight, child, f, g = weight[reached], child[reached], f[reached], g[reached]
+        np.add.at(occ, (g, p*F + f), weight)
+        # Each pick pairs with everyone drawn into its group later on
+        pair[p*F:(p+1)*F, q*F:] += oneHot[f].T @ (weight[:, None] * future[child, g])
+        mass = np.bincount(child, weights=weight, minlength=len(states))
+
+    # Back to teams: each class is spread evenly over its teams left
+    n = left.ravel()
+    letters = np.zeros((len(tables.names), G))
+    letters[known, groupOf[known]] = 1
+    letters[~known] = occ[:, classOf[~known]].T / n[classOf[~known], None]
+    # Teams already placed are in one group, so their pairs with everyone are
+    # the chance of being in that group
+    cogroup = letters @ letters.T
+    pair = pair + pair.T
+    cogroup[np.ix_(~known, ~known)] = (pair[np.ix_(classOf[~known], classOf[~known])] /
+                                       np.outer(n[classOf[~known]], n[classOf[~known]]))
+    np.fill_diagonal(cogroup, 1)
+    return cogroup, letters
+
+
+def exactProbabilities(tables):
+    # Exact (no sampling) probabilities of each pair of teams being in the same
+    # group (teams x teams) and of each team being in each group (teams x
+    # groups), for draws placed as in drawBatch
+    return conditionalProbabilities(tables)
+
+
+def compileTournament(definition):
+    # Integer tables for the array versions from a tournament definition
+    names, pots, feds = zip(*definition['teams'])
+    hosts = dict((team, ord(group) - ord('A'))
+                 for team, group in definition['hosts'].items())
+    return DrawTables(names, pots, feds, definition['caps'],
+                      definition['groups'], hosts)
+
+
+tables = compileTournament(loadTournament(tournament))
+
+
+# Run through the simulations, one Team/Group object at a time
+def simulateObjects(sims):
+    for drawNum in np.arange(sims):
+        # In each group at most 2 UEFA teams, 1 CAF, 1 AFC, 1 CONMEBOL and 1 
+        # CONCACAF are allowed
+
+        # 8 groups
+        groupA,groupB,groupC,groupD=Group('A'),Group('B'),Group('C'),Group('D')
+        groupE,groupF,groupG,groupH=Group('E'),Group('F'),Group('G'),Group('H')
+        groups = [groupA,groupB,groupC,groupD,groupE,groupF,groupG,groupH]
     
-    # Team A1 has to be Russia
-    groups[0].team1 = rus
-    groups[0].feds['uefa'] -= 1
-    teams[0].selected = groups[0].name
+        # Team A1 has to be Russia
+        groups[0].team1 = rus
+        groups[0].feds['uefa'] -= 1
+        teams[0].selected = groups[0].name
     
-    # Shrink pot1 to exclude Russia. Russia should be first team in pot1, but
-    # add a quick error check just in case
-    if pot1[0].name != 'Russia': raise ValueError()
+        # Shrink pot1 to exclude Russia. Russia should be first team in pot1, but
+        # add a quick error check just in case
+        if pot1[0].name != 'Russia': raise ValueError()
     
-    # Draw rest of pot 1 teams and place them in groups (in order)
-    # Can't put someone else in Group A yet
-    randomPot1 = np.random.choice(pot1[1:],size=7,replace=False)
+        # Draw rest of pot 1 teams and place them in groups (in order)
+        # Can't put someone else in Group A yet
+        randomPot1 = np.random.choice(pot1[1:],size=7,replace=False)
         
-    for n,group in enumerate(groups[1:]):
-        if randomPot1[n].name == pickedTeam:
-            pickedGroup = n+1
-        group.team1 = randomPot1[n]
-        group.feds[randomPot1[n].fed] -= 1
-        randomPot1[n].selected = group.name
-
-    # Now pot 2
-    groups = addToGroups(groups, pot2, 'team2')
-
-    # Now pot 3
-    groups = addToGroups(groups, pot3, 'team3')
+        for n,group in enumerate(groups[1:]):
+            if randomPot1[n].name == pickedTeam:
+                pickedGroup = n+1
+            group.team1 = randomPot1[n]
+            group.feds[randomPot1[n].fed] -= 1
+            randomPot1[n].selected = group.name
+
+        # Now pot 2
+        groups = addToGroups(groups, pot2, 'team2')
+
+        # Now pot 3
+        groups = addToGroups(groups, pot3, 'team3')
         
-    # Now pot 4
-    groups = addToGroups(groups, pot4, 'team4')
-
-    # Still can get impossible situations (~1% of the time). These arise from 
-    # the way I have counted possibilites (by adding together 'spaces'). There 
-    # is a work a round, but it makes the code a *lot* slower, whilst having no
-    # impact on the probabilities. Exclude those cases:
-    fail = False
-    for t in teams:
-        if t.selected == '':
-            fail = True
+        # Now pot 4
+        groups = addToGroups(groups, pot4, 'team4')
+
+        # Still can get impossible situations (~1% of the time). These arise from 
+        # the way I have counted possibilites (by adding together 'spaces'). There 
+        # is a work a round, but it makes the code a *lot* slower, whilst having no
+        # impact on the probabilities. Exclude those cases:
+        fail = False
+        for t in teams:
+            if t.selected == '':
+                fail = True
             
-    if fail == False:
-        # Which group is our interested team in?
-        intGroup = groups[np.where(np.array(groupOrder) == pickTeam.selected)[0][0]]
-        # Who else is with them?
-        for team in ['team1','team2','team3','team4']:
-            getattr(intGroup,team).picked += 1
-    else:
-        sims -= 1
+        if fail == False:
+            # Which group is our interested team in?
+            intGroup = groups[np.where(np.array(groupOrder) == pickTeam.selected)[0][0]]
+            # Who else is with them?
+            for team in ['team1','team2','team3','team4']:
+                getattr(intGroup,team).picked += 1
+        else:
+            sims -= 1
         
-    # Clean the team selected flag
-    for t in teams:
-        t.selected = ''
+        # Clean the team selected flag
+        for t in teams:
+            t.selected = ''
+
+    return sims
 
 
-# Finally print out the results
-for n,pot in enumerate([pot1,pot2,pot3,pot4]):
-    print('Pot',n+1,':')
-    for team in pot:
-        print('   ',team.name,':',np.round(team.picked*100./sims,decimals=2),
-              '%')
+if __name__ == "__main__":
+    # 'arrays' to simulate many draws at once, 'exact' for the exact
+    # probabilities (no simulations, ~20s for 2018, but 48 team tournaments
+    # have too many states) or 'objects' for the original (much slower)
+    # simulation
+    mode = 'arrays'
+    if mode == 'arrays':
+        picked, sims = simulate(tables, sims, pickedTeam)
+    elif mode == 'exact':
+        cogroup, letters = exactProbabilities(tables)
+        picked = cogroup[tables.names.index(pickedTeam)] * sims
+    else:
+        sims = simulateObjects(sims)
+        picked = np.array([team.picked for team in teams])
+
+    # Finally print out the results
+    for n in range(tables.nPots):
+        print('Pot',n+1,':')
+        for t in np.flatnonzero(tables.pot == n):
+            print('   ',tables.names[t],':',np.round(picked[t]*100./sims,decimals=2),
+                  '%')
         
-print(sims)
-print(dt.datetime.now()-time)
\ No newline at end of file
+    print(sims)
+    print(dt.datetime.now()-time)
\ No newline at end of file